@@ -1,12 +1,22 @@
 import os
 import io
 import json
+import time
+import asyncio
+import functools
+import zipfile
+from typing import List
 import tensorflow as tf
 import numpy as np
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, Query, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from src import models, preprocessing, config
+from src.batching import MicroBatcher
+from src.model_registry import ModelRegistry
+from src.result_cache import ResultCache, weights_version
+from src.workers import WorkerPools, ServerBusyError
+from src import audio_io, streaming
 
 # Inisialisasi Aplikasi FastAPI
 app = FastAPI(
@@ -30,32 +40,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global Variables untuk menyimpan Model yang dimuat (Lazy Loading)
-loaded_models = {}
+def weights_path(model_name: str):
+    # Path Relatif ke folder models
+    return os.path.join("models", f"{model_name}_best.h5")
 
-def get_trained_model(model_name: str):
+def load_trained_model(model_name: str):
     """
-    Memuat model yang sudah dilatih.
+    Memuat model yang sudah dilatih (dipanggil oleh model_registry, jangan panggil langsung).
     Strategi: Build Architecture (Keras 2 Compatible) -> Load Weights (from Keras 3 .h5)
     Ini menghindari error deserialisasi config (AttributeError: 'str' object has no attribute 'as_list')
+    Hasil: CompiledInference (tf.function dengan input_signature tetap, sudah di-trace saat load).
+    Hasil prediksi ter-cache dari bobot versi lain untuk model ini dibuang dari result_cache.
     """
-    if model_name in loaded_models:
-        return loaded_models[model_name]
-    
-    # Path Relatif ke folder models
-    model_path = os.path.join("models", f"{model_name}_best.h5")
+    model_path = weights_path(model_name)
+    # Versi bobot (mtime file) dicatat SEBELUM load: bagian dari key result cache
+    version = weights_version(model_path)
     
-    # Tentukan Input Shape sesuai Config
-    if model_name == 'cnn_stft':
-        # (174, 27, 1) sesuai trainer.py & config.py
-        # MFCC_MAX_LEN=174, N_MFCC=40 (tapi CNN biasa pakai STFT 27?)
-        # Cek trainer.py: spectro = get_spectrogram(wav) -> shape?
-        # Di app_api.py line 133: features = get_spectrogram(audio)
-        # Mari kita asumsikan (174, 27, 1) adalah benar untuk CNN-STFT sesuai error log tadi.
-        input_shape = (174, 27, 1) 
-    else:
-        # Transfer Learning (MobileNet, etc) pakai Input (40, 174, 3) atau (H, W, 3)
-        input_shape = (40, 174, 3)
+    # Tentukan Input Shape sesuai arsitektur: (174, 27, 1) untuk CNN-STFT, (40, 174, 1) untuk Transfer Learning
+    input_shape = models.get_serving_input_shape(model_name)
 
     # 1. Build Arsitektur Kosong (Versi Lokal Keras 2)
     print(f"Membangun arsitektur {model_name}...")
@@ -70,22 +72,142 @@ def get_trained_model(model_name: str):
         try:
             # Load weights biasanya lebih forgiving daripada load_model
             model.load_weights(model_path)
-            loaded_models[model_name] = model
-            return model
         except Exception as e:
             print(f"⚠️ Gagal load weights: {str(e)}")
             print("Mencoba fallback ke load_model (unsafe)...")
             # Fallback terakhir kalau struktur beda
             try:
                 model = tf.keras.models.load_model(model_path)
-                loaded_models[model_name] = model
-                return model
+                if model.input_shape[-1] != input_shape[-1]:
+                    # Model lama disimpan dengan input 3 channel: broadcast 1 -> 3 di dalam graph
+                    model = models.wrap_channel_broadcast(model)
+                input_shape = tuple(model.input_shape[1:])
             except:
                 raise RuntimeError(f"FATAL: Tidak bisa load model maupun weights {model_name}.")
     else:
         print(f"⚠️ Peringatan: Model file {model_path} tidak ditemukan. Menggunakan Random Weights.")
-        loaded_models[model_name] = model
-        return model
+
+    # 3. Lipat broadcast 1 -> 3 channel ke kernel konvolusi pertama (jika arsitektur memungkinkan)
+    folded = models.fold_channel_broadcast(model, model_name)
+    if folded is not model:
+        print(f"🧩 {model_name}: broadcast channel dilipat ke konvolusi pertama (input 1 channel)")
+        model = folded
+
+    # 4. Compile ke tf.function (Trace sekali di sini, dipakai ulang oleh endpoint)
+    inference_fn = models.CompiledInference(model, input_shape, weights_version=version)
+    print(f"✅ {model_name} siap. Signature: {inference_fn.input_signature[0].shape} (Trace: {inference_fn.trace_count})")
+
+    # 5. Bobot baru -> hasil prediksi lama untuk model ini tidak berlaku lagi
+    dropped = result_cache.invalidate(model_name, keep_version=version)
+    if dropped:
+        print(f"🧹 Result cache: {dropped} hasil {model_name} dari bobot lama dibuang")
+    return inference_fn
+
+# Registry model yang dimuat (Lazy Loading, thread-safe, dibatasi dengan LRU eviction)
+model_registry = ModelRegistry(load_trained_model)
+
+def get_trained_model(model_name: str):
+    """
+    Mengambil model dari registry. Load bersamaan untuk model yang sama hanya dijalankan sekali.
+    """
+    return model_registry.get(model_name)
+
+# Cache hasil prediksi (LRU + TTL): audio yang sama (hash PCM hasil decode) untuk model & bobot yang sama
+result_cache = ResultCache()
+
+def prediction_cache_key(model_name: str, digest: str):
+    """
+    Key result cache: (hash PCM, model, versi bobot). Versi bobot diambil dari model yang sedang resident
+    (bobot yang benar-benar dipakai); kalau belum dimuat, dari mtime file bobot yang akan dimuat.
+    Tidak memicu load model, jadi cache hit tetap cepat walau model sudah di-evict dari registry.
+    """
+    model = model_registry.peek(model_name)
+    version = model.weights_version if model is not None else weights_version(weights_path(model_name))
+    return (digest, model_name, version)
+
+# Thread/Process pool untuk pekerjaan CPU-bound (decode, fitur, inferensi) + backpressure
+worker_pools = WorkerPools()
+
+# Satu MicroBatcher per model: request yang datang bersamaan digabung jadi satu forward pass
+batchers = {}
+
+def get_batcher(model_name: str):
+    """
+    Mengambil (atau membuat) request coalescer untuk model tertentu.
+    """
+    if model_name not in batchers:
+        # Yang di-antrikan adalah waveform; fitur (STFT/MFCC) + inferensi dihitung sekali per batch.
+        # Model di-resolve lewat registry setiap batch, jadi batcher tidak menahan model yang sudah di-evict
+        batchers[model_name] = MicroBatcher(
+            lambda batch: predict_waveform_batch(model_name, *batch),
+            name=model_name,
+            executor=worker_pools.compute_pool,
+            collate_fn=preprocessing.stack_waveforms
+        )
+    return batchers[model_name]
+
+def get_feature_batcher(model_name: str):
+    """
+    Coalescer untuk input yang SUDAH berupa fitur (window real-time dari WebSocket):
+    fitur (H, W, 1) dari banyak koneksi di-stack lalu satu forward pass.
+    """
+    key = f"{model_name}/stream"
+    if key not in batchers:
+        batchers[key] = MicroBatcher(
+            lambda batch: get_trained_model(model_name)(batch),
+            name=key,
+            executor=worker_pools.compute_pool
+        )
+    return batchers[key]
+
+# Status warm-up (dibaca oleh /status): belum siap sampai semua model preload selesai di-warm-up
+warmup_state = {
+    "siap": False,
+    "models": {}
+}
+
+def warmup_models(model_names):
+    """
+    Preload + warm-up: build & load bobot, lalu jalankan dummy batch melalui tiap model
+    agar request pertama tidak menanggung biaya graph building, load .h5 dan trace.
+    """
+    # Filter resampling untuk sample rate upload yang umum (8k, 22.05k, 44.1k, 48k)
+    # + konstanta front-end fitur (mel matrix, Hann window, basis DCT)
+    preprocessing.precompute_resample_filters()
+    preprocessing.get_feature_extractor()
+
+    for model_name in model_names:
+        entry = warmup_state["models"].setdefault(model_name, {})
+        try:
+            t_start = time.perf_counter()
+            inference_fn = get_trained_model(model_name)
+            entry["load_ms"] = round((time.perf_counter() - t_start) * 1000, 1)
+
+            t_start = time.perf_counter()
+            dummy_batch = np.zeros((1,) + inference_fn.input_shape, dtype=np.float32)
+            inference_fn(dummy_batch)
+            entry["warmup_ms"] = round((time.perf_counter() - t_start) * 1000, 1)
+            print(f"🔥 Warm-up {model_name}: load {entry['load_ms']}ms, warm-up {entry['warmup_ms']}ms")
+        except Exception as e:
+            entry["error"] = str(e)
+            print(f"⚠️ Warm-up {model_name} gagal: {e}")
+
+    warmup_state["siap"] = True
+
+@app.on_event("startup")
+async def preload_models():
+    """
+    Startup hook: warm-up berjalan di thread terpisah supaya server tetap bisa menjawab
+    /status (dengan status "belum siap") selama proses berlangsung.
+    """
+    model_names = [m for m in config.PRELOAD_MODELS if m in config.MODELS]
+    for model_name in model_names:
+        warmup_state["models"][model_name] = {}
+    asyncio.get_running_loop().run_in_executor(None, warmup_models, model_names)
+
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    worker_pools.shutdown()
 
 @app.get("/")
 def read_root():
@@ -93,120 +215,315 @@ def read_root():
 
 @app.get("/status")
 def health_check():
-    """Endpoint untuk Health Check Cloud Run"""
-    return {"status": "sehat", "gpu_tersedia": len(tf.config.list_physical_devices('GPU')) > 0}
+    """Endpoint untuk Health Check Cloud Run (503 selama warm-up model belum selesai)"""
+    content = {
+        "status": "sehat" if warmup_state["siap"] else "belum siap",
+        "siap": warmup_state["siap"],
+        "gpu_tersedia": len(tf.config.list_physical_devices('GPU')) > 0,
+        "warmup": warmup_state["models"]
+    }
+    return JSONResponse(status_code=200 if warmup_state["siap"] else 503, content=content)
+
+def get_feature_type(model_name: str):
+    return 'stft' if model_name == 'cnn_stft' else 'mfcc'
+
+def predict_waveform_batch(model_name: str, audio: np.ndarray, lengths: np.ndarray):
+    """
+    Batch (B, T) waveform ter-padding + panjang asli -> fitur dalam SATU panggilan STFT -> inferensi.
+    Returns: probabilitas (B, num_classes)
+    """
+    # Transfer learning: fitur tetap 1 channel, broadcast ke 3 channel terjadi di dalam model
+    features = preprocessing.get_features_batch(audio, lengths, feature_type=get_feature_type(model_name))
+    
+    # DEBUG DEEP: Cek input yang masuk ke model. Shape: (B, 174, 27, 1) or (B, 40, 174, 1)
+    print(f"DEBUG INPUT SHAPE: {features.shape}")
+    
+    return get_trained_model(model_name)(features)
+
+async def stream_ffmpeg(file: UploadFile, stream: streaming.WaveformStream):
+    """
+    Upload non-WAV (webm/ogg/mp3) -> ffmpeg secara streaming: chunk upload ditulis ke stdin ffmpeg
+    sementara PCM 16-bit dari stdout langsung diteruskan ke `stream`. Tidak ada salinan file utuh.
+    Catatan: tiap upload terkompresi tetap menjalankan SATU proses ffmpeg (hanya WAV PCM yang di-decode
+    in-process). RuntimeError (berisi stderr ffmpeg) jika ffmpeg gagal men-decode.
+    """
+    await file.seek(0)
+    process = await asyncio.create_subprocess_exec(
+        *audio_io.ffmpeg_command(config.SAMPLE_RATE),
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+
+    async def pump():
+        try:
+            while chunk := await file.read(config.UPLOAD_CHUNK_BYTES):
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ffmpeg berhenti lebih awal; error-nya dibaca dari stderr
+        finally:
+            process.stdin.close()
+
+    writer = asyncio.create_task(pump())
+    try:
+        carry = b''
+        while data := await process.stdout.read(config.UPLOAD_CHUNK_BYTES):
+            data = carry + data
+            usable = len(data) - len(data) % 2
+            carry = data[usable:]
+            samples = np.multiply(np.frombuffer(data, dtype='<i2', count=usable // 2), 1.0 / 32768.0, dtype=np.float32)
+            await worker_pools.run_compute(stream.feed, samples)
+        await writer
+        stderr = await process.stderr.read()
+        if await process.wait() != 0:
+            raise RuntimeError(f"ffmpeg decode failed: {stderr.decode('utf-8', 'replace').strip()}")
+    finally:
+        writer.cancel()
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+async def ingest_upload(file: UploadFile, stream: streaming.WaveformStream):
+    """
+    Membaca upload per chunk (config.UPLOAD_CHUNK_BYTES) dan men-decode tiap chunk langsung ke `stream`
+    (resampling, VAD, window & fitur dihitung bertahap). Memori per request dibatasi oleh ukuran window,
+    bukan ukuran file. streaming.AudioTooLongError dilempar begitu durasi maksimum terlampaui
+    (untuk WAV: langsung dari header, sebelum sample di-decode). File rusak / format yang tidak didukung
+    (WAV fast path dan ffmpeg sama-sama gagal) -> HTTPException 400 dengan pesan dari ffmpeg.
+    """
+    # Fast path: WAV PCM di-decode in-process per chunk (tanpa proses ffmpeg, tanpa export ulang).
+    # Browser recording (.webm/.ogg/.mp3) atau WAV yang tidak didukung -> ffmpeg streaming.
+    chunk = await file.read(config.UPLOAD_CHUNK_BYTES)
+    if audio_io.is_riff_wav(chunk):
+        decoder = audio_io.WavStreamDecoder()
+        try:
+            while chunk:
+                await worker_pools.run_compute(streaming.feed_wav_chunk, stream, decoder, chunk)
+                chunk = await file.read(config.UPLOAD_CHUNK_BYTES)
+            decoder.finish()
+            print(f"DEBUG SAMPLE RATE DETECTED: {decoder.sample_rate} Hz (Expected: {config.SAMPLE_RATE} Hz)")
+            return
+        except streaming.AudioTooLongError:
+            raise
+        except audio_io.UnsupportedSampleRateError as e:
+            raise HTTPException(status_code=400, detail=f"Sample rate tidak didukung: {e}")
+        except ValueError as e:
+            # Fallback hanya aman selama belum ada sample yang masuk ke stream (error header/format);
+            # data rusak di tengah file -> ffmpeg akan men-decode ulang dari awal dan audio jadi dobel
+            if stream.num_input_samples > 0:
+                raise HTTPException(status_code=400, detail=f"File WAV rusak setelah {stream.num_input_samples} sample: {e}")
+            print(f"⚠️ WAV fast path tidak bisa dipakai ({e}). Fallback ke ffmpeg...")
+
+    try:
+        await stream_ffmpeg(file, stream)
+    except streaming.AudioTooLongError:
+        raise
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"File audio tidak bisa di-decode: {e}")
+    print(f"✅ Audio Conversion Success (ffmpeg streaming): {file.filename} -> PCM 16-bit ({stream.num_samples} samples)")
+
+# Supported extensions
+ALLOWED_EXTENSIONS = ('.wav', '.WAV', '.webm', '.WEBM', '.ogg', '.OGG', '.mp3', '.MP3')
+
+def aggregate_windows(probabilities: np.ndarray, method: str = 'mean'):
+    """
+    Agregasi probabilitas per window (N, num_classes) -> (num_classes,).
+    - mean: rata-rata probabilitas
+    - max : probabilitas maksimum per kelas (dinormalisasi agar jumlahnya 1)
+    - vote: proporsi window yang memprediksi tiap kelas (majority vote)
+    """
+    if method == 'max':
+        peak = probabilities.max(axis=0)
+        return peak / peak.sum()
+    if method == 'vote':
+        votes = np.bincount(probabilities.argmax(axis=1), minlength=probabilities.shape[1])
+        return votes / votes.sum()
+    return probabilities.mean(axis=0)
+
+def shared_features(waveform: np.ndarray, feature_types):
+    """
+    Satu waveform -> {feature_type: fitur (1, H, W, 1)}: padding/masking sekali, STFT-mel dan MFCC
+    masing-masing sekali untuk semua model yang membutuhkannya.
+    """
+    audio, lengths = preprocessing.stack_waveforms([waveform])
+    features = preprocessing.get_features_multi(audio, lengths, feature_types)
+    return {feature_type: value.numpy() for feature_type, value in features.items()}
+
+# Harus didaftarkan SEBELUM /predict/{model_name}, kalau tidak "ensemble" dianggap nama model
+@app.post("/predict/ensemble")
+async def predict_ensemble(file: UploadFile = File(...), model_names: str = Query("", alias="models"), weights: str = ""):
+    """
+    Ensemble beberapa model untuk SATU upload (tampilan perbandingan model di dashboard).
+    Decode + resampling sekali, fitur STFT-mel dan MFCC masing-masing sekali, lalu semua model
+    dijalankan bersamaan (lewat micro-batcher fitur per model). Model yang hasilnya sudah ada di
+    result cache dilewati (fiturnya juga tidak dihitung kalau tidak ada model lain yang butuh).
+    Args:
+        models: nama model dipisah koma (default: semua model)
+        weights: bobot per model dipisah koma, urutan sama dengan `models` (default: sama rata)
+    Returns: probabilitas per model, gabungan (rata-rata berbobot) dan timing per tahap (ms)
+    """
+    model_names = [m.strip() for m in model_names.split(',') if m.strip()] or list(config.MODELS)
+    unknown = [m for m in model_names if m not in config.MODELS]
+    if unknown or len(set(model_names)) != len(model_names):
+        raise HTTPException(status_code=400, detail=f"Daftar model tidak valid: {model_names}. Pilihan: {list(config.MODELS.keys())}")
+    try:
+        model_weights = [float(w) for w in weights.split(',')] if weights.strip() else [1.0] * len(model_names)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Bobot harus berupa angka dipisah koma.")
+    if len(model_weights) != len(model_names) or min(model_weights) < 0 or sum(model_weights) <= 0:
+        raise HTTPException(status_code=400, detail="Jumlah bobot harus sama dengan jumlah model, tidak negatif, dan totalnya > 0.")
+    if not file.filename.endswith(ALLOWED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"Format file tidak didukung. Gunakan: {ALLOWED_EXTENSIONS}")
+
+    try:
+        worker_pools.acquire()
+    except ServerBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Server sedang sibuk, coba lagi nanti ({e}).", headers={"Retry-After": "1"})
+
+    try:
+        started = time.perf_counter()
+
+        # 1. Decode + resampling (+ VAD) SEKALI
+        stream = streaming.WaveformStream()
+        try:
+            await ingest_upload(file, stream)
+            waveform = await worker_pools.run_compute(stream.finish)
+        except streaming.AudioTooLongError as e:
+            raise HTTPException(status_code=413, detail=f"Audio terlalu panjang ({e}). Maksimum: {config.MAX_AUDIO_SECONDS:.0f} detik.")
+        digest = ResultCache.digest(waveform)
+        cache_keys = {m: prediction_cache_key(m, digest) for m in model_names}
+        cached = {m: result_cache.get(cache_keys[m]) for m in model_names}
+        decoded = time.perf_counter()
+
+        # 2. Fitur SEKALI per jenis (cnn_stft -> STFT-mel, transfer learning -> MFCC), hanya untuk model yang belum ter-cache
+        feature_types = sorted({get_feature_type(m) for m in model_names if cached[m] is None})
+        features = await worker_pools.run_compute(shared_features, waveform, feature_types) if feature_types else {}
+        featurised = time.perf_counter()
+
+        # 3. Semua model bersamaan
+        async def run_model(model_name):
+            model_started = time.perf_counter()
+            probs = cached[model_name]
+            if probs is None:
+                probs = await get_feature_batcher(model_name).predict(features[get_feature_type(model_name)][0])
+                result_cache.put(cache_keys[model_name], probs)
+            return probs, (time.perf_counter() - model_started) * 1000.0
+
+        results = await asyncio.gather(*(run_model(m) for m in model_names))
+        finished = time.perf_counter()
+
+        total_weight = sum(model_weights)
+        combined = sum(w * probs for w, (probs, _) in zip(model_weights, results)) / total_weight
+        print(f"🧮 Ensemble {model_names}: {(finished - started) * 1000.0:.1f} ms")
+
+        return JSONResponse(content={
+            "models": {
+                m: dict(prediction_fields(probs), bobot=w / total_weight, inferensi_ms=elapsed,
+                        cache="hit" if cached[m] is not None else "miss")
+                for m, w, (probs, elapsed) in zip(model_names, model_weights, results)
+            },
+            "ensemble": prediction_fields(combined),
+            "durasi_audio_sample": stream.length,
+            "vad": stream.vad_report(),
+            "timing_ms": {
+                "decode": (decoded - started) * 1000.0,
+                "fitur": (featurised - decoded) * 1000.0,
+                "inferensi": (finished - featurised) * 1000.0,
+                "total": (finished - started) * 1000.0
+            }
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+    finally:
+        worker_pools.release()
 
 @app.post("/predict/{model_name}")
-async def predict_audio(model_name: str, file: UploadFile = File(...)):
+async def predict_audio(model_name: str, file: UploadFile = File(...), mode: str = "single", aggregate: str = "mean"):
     """
     Endpoint utama untuk prediksi audio.
     Args:
         model_name: Nama model arsitektur (cnn_stft, mobilenetv3, dll)
         file: File audio (.wav) yang diupload
+        mode: "single" (hanya ~5.6s pertama, default) atau "window" (sliding window atas seluruh audio)
+        aggregate: agregasi probabilitas antar window untuk mode "window": mean, max, atau vote
     """
     
     # Validasi Nama Model
     if model_name not in config.MODELS:
         raise HTTPException(status_code=400, detail=f"Model tidak dikenal. Pilihan: {list(config.MODELS.keys())}")
+    if mode not in ("single", "window"):
+        raise HTTPException(status_code=400, detail="Mode tidak dikenal. Pilihan: ['single', 'window']")
+    if aggregate not in config.WINDOW_AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"Agregasi tidak dikenal. Pilihan: {list(config.WINDOW_AGGREGATIONS)}")
     
     # Supported extensions
-    ALLOWED_EXTENSIONS = ('.wav', '.WAV', '.webm', '.WEBM', '.ogg', '.OGG', '.mp3', '.MP3')
     if not file.filename.endswith(ALLOWED_EXTENSIONS):
         raise HTTPException(status_code=400, detail=f"Format file tidak didukung. Gunakan: {ALLOWED_EXTENSIONS}")
 
+    # Backpressure: tolak lebih awal kalau antrian penuh (daripada membuat semua request lambat)
     try:
-        # Membaca konten file
-        file_content = await file.read()
-        
-        # --- AUDIO CONVERSION LOGIC ---
-        # Browser recording biasanya .webm atau .ogg. TensorFlow butuh .wav PCM 16-bit logic.
-        # Kita gunakan pydub untuk standardisasi ke WAV.
-        import pydub
-        
-        # Load audio from bytes
-        try:
-            # Pydub auto-detect format based on content usually, but extension helps
-            # Wrap bytes in BytesIO
-            audio_segment = pydub.AudioSegment.from_file(io.BytesIO(file_content))
-            
-            # Convert to standard WAV (16-bit PCM, Mono, 16000Hz preferred)
-            # Force Mono
-            audio_segment = audio_segment.set_channels(1) 
-            
-            # Force 16-bit PCM (2 bytes) because TensorFlow decode_wav ONLY supports 16-bit
-            # Pydub: 1 byte=8bit, 2=16bit, 4=32bit
-            audio_segment = audio_segment.set_sample_width(2)
-            
-            # Export to buffer as WAV
-            wav_io = io.BytesIO()
-            # Explicitly specify format parameters to ensure compatibility
-            audio_segment.export(wav_io, format="wav", parameters=["-acodec", "pcm_s16le"])
-            file_content = wav_io.getvalue()
-            
-            print(f"✅ Audio Conversion Success: {file.filename} -> WAV 16-bit (Duration: {len(audio_segment)}ms)")
-            
-        except Exception as e:
-            print(f"⚠️ Pydub Conversion Failed: {e}. Trying raw decode...")
-            # If pydub fails (maybe raw wav already), invoke TF directly
-            pass
+        worker_pools.acquire()
+    except ServerBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Server sedang sibuk, coba lagi nanti ({e}).", headers={"Retry-After": "1"})
 
-        # Decode Audio menggunakan fungsi TensorFlow
-        audio_tensor, sample_rate = tf.audio.decode_wav(file_content, desired_channels=1)
-        audio_tensor = tf.squeeze(audio_tensor, axis=-1)
-        
-        # DEBUG SAMPLE RATE
-        print(f"DEBUG SAMPLE RATE DETECTED: {int(sample_rate)} Hz (Expected: {config.SAMPLE_RATE} Hz)")
-        
-        # RESAMPLING LOGIC (Pure TensorFlow)
-        if int(sample_rate) != config.SAMPLE_RATE:
-            print(f"⚠️ Mismatch Detected! Resampling {int(sample_rate)}Hz -> {config.SAMPLE_RATE}Hz...")
-            
-            # Wajib Casting ke float32 dulu
-            audio_tensor = tf.cast(audio_tensor, tf.float32)
-            
-            # Hitung panjang baru
-            current_len = tf.shape(audio_tensor)[0]
-            ratio = config.SAMPLE_RATE / tf.cast(sample_rate, tf.float32)
-            new_len = tf.cast(tf.cast(current_len, tf.float32) * ratio, tf.int32)
-            
-            # Resize butuh spek [Batch, Height, Width, Channels]
-            # Kita anggap Audio (1D) sebagai Image (Width=Time, Height=1)
-            audio_reshaped = tf.reshape(audio_tensor, [1, 1, -1, 1]) 
-            
-            # Resize
-            audio_resized = tf.image.resize(audio_reshaped, [1, new_len], method='bilinear')
-            
-            # Balikin ke [Time]
-            audio_tensor = tf.squeeze(audio_resized)
-            
-            print(f"✅ Resampling Selesai. New Shape: {audio_tensor.shape}")
-
-        # Preprocessing (STFT atau MFCC)
-        feature_type = 'stft' if model_name == 'cnn_stft' else 'mfcc'
+    try:
+        # Upload dibaca & di-decode per chunk. Mode window: fitur dihitung per grup window selama upload masuk
+        feature_type = get_feature_type(model_name)
+        window_features, window_lengths, window_starts = [], [], []
+
+        def collect_windows(windows, lengths, starts):
+            window_features.append(preprocessing.get_features_batch(windows, lengths, feature_type=feature_type).numpy())
+            window_lengths.extend(lengths.tolist())
+            window_starts.extend(starts.tolist())
+
+        stream = streaming.WaveformStream(windowed=(mode == "window"), on_windows=collect_windows)
+        try:
+            await ingest_upload(file, stream)
+            waveform = await worker_pools.run_compute(stream.finish)
+        except streaming.AudioTooLongError as e:
+            raise HTTPException(status_code=413, detail=f"Audio terlalu panjang ({e}). Maksimum: {config.MAX_AUDIO_SECONDS:.0f} detik.")
+        num_samples = stream.length
+        vad = stream.vad_report()
+        if vad is not None:
+            print(f"✂️ VAD: {vad['frames_removed']} frame silence dibuang ({vad['removed_start_ms']:.0f} ms awal, {vad['removed_end_ms']:.0f} ms akhir)")
         
-        if feature_type == 'stft':
-            features = preprocessing.get_spectrogram(audio_tensor)
+        timeline = None
+        cache_status = None
+        if mode == "window":
+            # Sliding window: semua window (fiturnya sudah dihitung saat streaming) dalam SATU forward pass
+            # Model di-resolve di compute thread: load dingin / menunggu load bersamaan tidak memblokir event loop
+            window_probs = await worker_pools.run_compute(lambda batch: get_trained_model(model_name)(batch), np.concatenate(window_features))
+            predictions = np.expand_dims(aggregate_windows(window_probs, aggregate), axis=0)
+            timeline = [
+                {
+                    "window": i,
+                    "mulai_detik": float(start) / config.SAMPLE_RATE,
+                    "selesai_detik": float(start + length) / config.SAMPLE_RATE,
+                    "prediksi": "Dysarthric" if probs[1] > probs[0] else "Control",
+                    "Control": float(probs[0]),
+                    "Dysarthric": float(probs[1])
+                }
+                for i, (probs, start, length) in enumerate(zip(window_probs, window_starts, window_lengths))
+            ]
+            print(f"🪟 Sliding window: {len(timeline)} window, agregasi '{aggregate}'")
         else:
-            features = preprocessing.get_mfcc(audio_tensor)
-            # Transfer learning models expect 3 channels (RGB), replicate grayscale to RGB
-            features = tf.repeat(features, 3, axis=-1)  # (40, 174, 1) -> (40, 174, 3)
-            
-        # Tambahkan batch dimension (Model expect inputs: [Batch, H, W, C])
-        # Current logic di preprocessing bisa saja sudah add batch jika pakai logic lama,
-        # Kita cek shape. preprocessing.get_spectrogram outputs (174, 27, 1)
-        
-        features = tf.expand_dims(features, axis=0) # Shape: (1, 174, 27, 1) or (1, 40, 174, 3)
-        
-        # DEBUG DEEP: Cek input yang masuk ke model
-        feat_chk = features.numpy()
-        print(f"DEBUG INPUT SHAPE: {feat_chk.shape}")
-        print(f"DEBUG INPUT STATS: Min={feat_chk.min():.4f}, Max={feat_chk.max():.4f}, Mean={feat_chk.mean():.4f}")
-        
-        # Load Model & Prediksi
-        model = get_trained_model(model_name)
-        
-        # Lakukan Inferensi
-        predictions = model.predict(features)
+            # Load Model & Prediksi (via Micro-Batcher, digabung dengan request lain yang bersamaan).
+            # Hanya ~5.6s pertama yang dipakai model (stream hanya menyimpan window pertama)
+            # Audio yang sama (hash PCM) untuk model & bobot yang sama langsung diambil dari result cache
+            cache_key = prediction_cache_key(model_name, ResultCache.digest(waveform))
+            probs = result_cache.get(cache_key)
+            cache_status = "hit" if probs is not None else "miss"
+            if probs is None:
+                batcher = get_batcher(model_name)
+
+                # Lakukan Inferensi (Preprocessing STFT/MFCC dihitung per batch di dalam batcher)
+                probs = await batcher.predict(waveform)
+                result_cache.put(cache_key, probs)
+            predictions = np.expand_dims(probs, axis=0)
         
         # DEBUG: Print Raw Probabilities
         print(f"DEBUG PREDIKSI RAW: {predictions}")
@@ -223,7 +540,9 @@ async def predict_audio(model_name: str, file: UploadFile = File(...)):
         predicted_label = "Dysarthric" if confidence_dysarthric > confidence_control else "Control"
         confidence_score = max(confidence_control, confidence_dysarthric)
         
-        return JSONResponse(content={
+        # peek: cache hit tidak boleh memicu load model yang sudah di-evict dari registry
+        inference_fn = model_registry.peek(model_name)
+        response = {
             "model": model_name,
             "prediksi": predicted_label,
             "confidence": f"{confidence_score:.2%}",
@@ -231,13 +550,374 @@ async def predict_audio(model_name: str, file: UploadFile = File(...)):
                 "Control": confidence_control,
                 "Dysarthric": confidence_dysarthric
             },
-            "durasi_audio_sample": len(audio_tensor)
-        })
+            "durasi_audio_sample": num_samples,
+            "vad": vad,
+            "cache": cache_status,
+            "tracing": inference_fn.stats() if inference_fn is not None else None
+        }
+        if timeline is not None:
+            response.update({"mode": mode, "agregasi": aggregate, "jumlah_window": len(timeline), "timeline": timeline})
+        return JSONResponse(content=response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+    finally:
+        worker_pools.release()
+
+def prediction_fields(probabilities: np.ndarray):
+    """
+    Field hasil standar (sama dengan response /predict) dari probabilitas [Control, Dysarthric].
+    """
+    confidence_control = float(probabilities[0])
+    confidence_dysarthric = float(probabilities[1])
+    return {
+        "prediksi": "Dysarthric" if confidence_dysarthric > confidence_control else "Control",
+        "confidence": f"{max(confidence_control, confidence_dysarthric):.2%}",
+        "detail_probabilitas": {
+            "Control": confidence_control,
+            "Dysarthric": confidence_dysarthric
+        }
+    }
+
+class BatchTooLargeError(ValueError):
+    """Upload batch (atau satu entry zip) melebihi batas ukuran setelah di-decompress -> 413."""
+
+def read_zip_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_bytes: int):
+    """
+    Decompress satu entry dengan read terbatas: tidak pernah lebih dari `max_bytes` + 1 byte di memori,
+    walaupun ukuran di header zip dipalsukan.
+    """
+    with archive.open(info) as entry:
+        content = entry.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise BatchTooLargeError(f"Entry zip {info.filename} lebih besar dari {max_bytes} byte setelah di-decompress")
+    return content
+
+def expand_batch_uploads(uploads):
+    """
+    Daftar clip dari upload batch: file audio apa adanya, arsip .zip di-expand menjadi entry audionya.
+    Entry zip baru di-decompress saat clip-nya diproses (ZipFile aman dibaca dari beberapa thread).
+    Proteksi zip bomb: ukuran entry (file_size di header) dibatasi config.BATCH_ENTRY_MAX_BYTES, total
+    ukuran tanpa kompresi per request dibatasi config.BATCH_PREDICT_MAX_BYTES (BatchTooLargeError),
+    dan entry dibaca dengan read terbatas (read_zip_entry).
+    Returns: list of (nama, loader) dengan loader() -> bytes
+    """
+    items = []
+    total_bytes = 0
+    for filename, content in uploads:
+        if filename.lower().endswith('.zip') or zipfile.is_zipfile(io.BytesIO(content)):
+            archive = zipfile.ZipFile(io.BytesIO(content))
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.endswith(ALLOWED_EXTENSIONS) and not os.path.basename(info.filename).startswith('.'):
+                    if info.file_size > config.BATCH_ENTRY_MAX_BYTES:
+                        raise BatchTooLargeError(f"Entry zip {filename}/{info.filename} terlalu besar ({info.file_size} byte). "
+                                                 f"Maksimum: {config.BATCH_ENTRY_MAX_BYTES} byte.")
+                    total_bytes += info.file_size
+                    max_bytes = min(info.file_size, config.BATCH_ENTRY_MAX_BYTES)
+                    items.append((f"{filename}/{info.filename}", functools.partial(read_zip_entry, archive, info, max_bytes)))
+        elif filename.endswith(ALLOWED_EXTENSIONS):
+            total_bytes += len(content)
+            items.append((filename, lambda content=content: content))
+        else:
+            raise ValueError(f"Format file tidak didukung: {filename}. Gunakan: {ALLOWED_EXTENSIONS} atau .zip")
+        if total_bytes > config.BATCH_PREDICT_MAX_BYTES:
+            raise BatchTooLargeError(f"Total ukuran upload tanpa kompresi melebihi {config.BATCH_PREDICT_MAX_BYTES} byte.")
+    return items
+
+def wav_clip(file_content: bytes):
+    """
+    WAV -> window pertama pada config.SAMPLE_RATE (resampling + VAD sama dengan /predict mode single).
+    """
+    stream = streaming.WaveformStream()
+    decoder = audio_io.WavStreamDecoder()
+    streaming.feed_wav_chunk(stream, decoder, file_content)
+    decoder.finish()
+    return stream.finish(), stream.length
+
+def pcm_clip(waveform: np.ndarray, sample_rate: int):
+    stream = streaming.WaveformStream()
+    stream.feed(waveform, sample_rate)
+    return stream.finish(), stream.length
+
+async def decode_clip(load):
+    """
+    Satu clip batch -> (waveform window pertama, jumlah sample). WAV in-process, format lain lewat ffmpeg
+    di decode process pool.
+    """
+    file_content = await worker_pools.run_compute(load)
+    if audio_io.is_riff_wav(file_content):
+        try:
+            return await worker_pools.run_compute(wav_clip, file_content)
+        except (streaming.AudioTooLongError, audio_io.UnsupportedSampleRateError):
+            raise
+        except ValueError:
+            pass
+    waveform, sample_rate = await worker_pools.run_decode(audio_io.decode_with_ffmpeg, file_content)
+    return await worker_pools.run_compute(pcm_clip, waveform, sample_rate)
+
+def ndjson_line(obj):
+    return (json.dumps(obj) + "\n").encode('utf-8')
+
+async def stream_batch_predictions(model_name: str, items):
+    """
+    Decode paralel (maks 2 x config.BATCH_PREDICT_SIZE clip sekaligus), fitur + inferensi per batch
+    config.BATCH_PREDICT_SIZE clip, hasil per file dikirim sebagai NDJSON begitu batch-nya selesai.
+    Baris terakhir: ringkasan {"selesai": true, ...}. Slot worker_pools dilepas oleh SlotStreamingResponse.
+    """
+    started = time.perf_counter()
+    batch_size = max(1, config.BATCH_PREDICT_SIZE)
+    queue = list(reversed(items))
+    names = {}
+    pending = set()
+    ready = []
+    succeeded = failed = 0
+    try:
+        while queue or pending or ready:
+            while queue and len(pending) + len(ready) < 2 * batch_size:
+                name, load = queue.pop()
+                task = asyncio.ensure_future(decode_clip(load))
+                names[task] = name
+                pending.add(task)
+
+            if pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = names.pop(task)
+                    try:
+                        waveform, num_samples = task.result()
+                    except Exception as e:
+                        failed += 1
+                        detail = f"Audio terlalu panjang ({e})" if isinstance(e, streaming.AudioTooLongError) else (str(e) or type(e).__name__)
+                        yield ndjson_line({"file": name, "model": model_name, "error": detail})
+                        continue
+                    # Clip yang hasilnya sudah ada di result cache langsung dikirim, tidak ikut batch
+                    cache_key = prediction_cache_key(model_name, ResultCache.digest(waveform))
+                    probs = result_cache.get(cache_key)
+                    if probs is not None:
+                        succeeded += 1
+                        yield ndjson_line(dict({"file": name, "model": model_name}, **prediction_fields(probs),
+                                               durasi_audio_sample=num_samples, cache="hit"))
+                    else:
+                        ready.append((name, waveform, num_samples, cache_key))
+
+            # Batch parsial hanya dijalankan kalau tidak ada clip lain yang masih bisa menggenapinya
+            while len(ready) >= batch_size or (ready and not pending and not queue):
+                batch, ready = ready[:batch_size], ready[batch_size:]
+                audio, lengths = preprocessing.stack_waveforms([waveform for _, waveform, _, _ in batch])
+                probabilities = await worker_pools.run_compute(predict_waveform_batch, model_name, audio, lengths)
+                for (name, _, num_samples, cache_key), probs in zip(batch, probabilities):
+                    succeeded += 1
+                    result_cache.put(cache_key, probs)
+                    yield ndjson_line(dict({"file": name, "model": model_name}, **prediction_fields(probs),
+                                           durasi_audio_sample=num_samples, cache="miss"))
+
+        yield ndjson_line({
+            "selesai": True,
+            "model": model_name,
+            "jumlah_file": len(items),
+            "berhasil": succeeded,
+            "gagal": failed,
+            "durasi_detik": time.perf_counter() - started
+        })
+    finally:
+        for task in pending:
+            task.cancel()
+
+class SlotStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse yang memegang satu slot worker_pools (sudah di-acquire oleh handler) dan
+    melepasnya begitu response selesai, gagal, atau client putus. Tidak bisa di finally generator:
+    kalau client putus sebelum body mulai dikirim, generator tidak pernah jalan dan slot bocor.
+    """
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            worker_pools.release()
+
+@app.post("/predict/{model_name}/batch")
+async def predict_batch(model_name: str, files: List[UploadFile] = File(...)):
+    """
+    Prediksi banyak clip dalam satu request (file audio dan/atau arsip .zip).
+    Response: NDJSON (application/x-ndjson), satu baris per file begitu batch-nya selesai diproses.
+    """
+    if model_name not in config.MODELS:
+        raise HTTPException(status_code=400, detail=f"Model tidak dikenal. Pilihan: {list(config.MODELS.keys())}")
+
+    # Starlette menutup UploadFile begitu handler return, jadi isinya diambil sebelum response streaming dimulai
+    uploads = [(file.filename, await file.read()) for file in files]
+    try:
+        items = expand_batch_uploads(uploads)
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=400, detail="Tidak ada file audio di dalam upload.")
+    if len(items) > config.BATCH_PREDICT_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Terlalu banyak file ({len(items)}). Maksimum: {config.BATCH_PREDICT_MAX_FILES}.")
+
+    try:
+        worker_pools.acquire()
+    except ServerBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Server sedang sibuk, coba lagi nanti ({e}).", headers={"Retry-After": "1"})
+
+    try:
+        print(f"📦 Batch {model_name}: {len(items)} file")
+        return SlotStreamingResponse(stream_batch_predictions(model_name, items), media_type="application/x-ndjson")
+    except BaseException:
+        worker_pools.release()
+        raise
+
+PCM_FORMATS = {"s16le": ('<i2', 1.0 / 32768.0), "f32le": ('<f4', 1.0)}
+
+@app.websocket("/ws/predict/{model_name}")
+async def predict_realtime(websocket: WebSocket, model_name: str, sample_rate: int = config.SAMPLE_RATE,
+                           pcm: str = "s16le", hop_frames: int = config.STREAM_HOP_FRAMES):
+    """
+    Inferensi real-time lewat WebSocket (rekaman browser dikirim sambil merekam).
+    Protokol:
+      - client -> server: pesan binary berisi PCM mono (`pcm` = s16le atau f32le, `sample_rate` Hz),
+        lalu pesan teks "end" saat rekaman selesai
+      - server -> client (JSON): {"event": "siap"}, lalu {"event": "prediksi"} begitu window 174 frame
+        STFT terisi dan setiap `hop_frames` frame sesudahnya, dan {"event": "selesai"} (rata-rata semua window)
+    State STFT bergulir (streaming.RollingFeatures): hanya frame baru yang dihitung per chunk,
+    sehingga hasil tersedia hampir tanpa jeda setelah rekaman selesai.
+    VAD (config.VAD_ENABLED): sama seperti /predict (streaming.WaveformStream), 2 window pertama ditahan
+    lalu silence di awal dipotong dengan trim_silence (rekaman yang muat di 2 window itu juga dipotong
+    di akhir), jadi prediksi pertama baru keluar setelah ~11 detik audio atau saat "end".
+    """
+    await websocket.accept()
+    if model_name not in config.MODELS or pcm not in PCM_FORMATS or not config.MIN_INPUT_SAMPLE_RATE <= sample_rate <= config.MAX_INPUT_SAMPLE_RATE:
+        await websocket.send_json({"event": "error", "detail": f"Parameter tidak valid. Model: {list(config.MODELS.keys())}, pcm: {list(PCM_FORMATS)}, "
+                                                             f"sample_rate: {config.MIN_INPUT_SAMPLE_RATE}-{config.MAX_INPUT_SAMPLE_RATE} Hz"})
+        await websocket.close(code=1008)
+        return
+    try:
+        worker_pools.acquire()
+    except ServerBusyError as e:
+        await websocket.send_json({"event": "error", "detail": f"Server sedang sibuk, coba lagi nanti ({e})."})
+        await websocket.close(code=1013)
+        return
+
+    try:
+        await worker_pools.run_compute(get_trained_model, model_name)
+        rolling = streaming.RollingFeatures(get_feature_type(model_name), hop_frames)
+        resampler = preprocessing.StreamingResampler(sample_rate) if sample_rate != config.SAMPLE_RATE else None
+        batcher = get_feature_batcher(model_name)
+        max_samples = config.MAX_AUDIO_SECONDS * config.SAMPLE_RATE if config.MAX_AUDIO_SECONDS > 0 else None
+        dtype, scale = PCM_FORMATS[pcm]
+        item_size = np.dtype(dtype).itemsize
+        history = []
+        carry = b''
+        # VAD: sample (16 kHz) yang ditahan sebelum window pertama, None = sudah diteruskan ke `rolling`
+        head = [] if config.VAD_ENABLED else None
+        head_size = 0
+        num_samples = 0
+        removed = {"start": 0, "end": 0}
+
+        def accept(samples, final=False):
+            nonlocal head, head_size, num_samples
+            num_samples += len(samples)
+            if head is None:
+                return rolling.push(samples)
+            head.append(samples)
+            head_size += len(samples)
+            if head_size < 2 * config.AUDIO_MAX_LENGTH and not final:
+                return []
+            audio = np.concatenate(head)
+            head = None
+            trimmed, start, end = preprocessing.trim_silence(audio)
+            removed["start"] = int(start)
+            if final:
+                # Seluruh rekaman ada di head: silence di akhir juga diketahui
+                removed["end"] = int(end)
+                return rolling.push(trimmed.numpy())
+            return rolling.push(audio[removed["start"]:])
+
+        def push(samples):
+            if resampler is not None:
+                samples = resampler.process(samples)
+            return accept(samples)
+
+        def finish():
+            rest = resampler.flush() if resampler is not None else np.zeros((0,), dtype=np.float32)
+            windows = accept(rest, final=True)
+            tail = rolling.tail_window()
+            return windows + ([tail] if tail is not None else [])
+
+        async def emit(windows):
+            for features, start, end in windows:
+                started = time.perf_counter()
+                probs = await batcher.predict(features)
+                history.append(probs)
+                await websocket.send_json({
+                    "event": "prediksi",
+                    "window": len(history) - 1,
+                    "mulai_detik": start / config.SAMPLE_RATE,
+                    "selesai_detik": end / config.SAMPLE_RATE,
+                    "prediksi": "Dysarthric" if probs[1] > probs[0] else "Control",
+                    "Control": float(probs[0]),
+                    "Dysarthric": float(probs[1]),
+                    "latency_ms": (time.perf_counter() - started) * 1000.0
+                })
+
+        await websocket.send_json({
+            "event": "siap",
+            "model": model_name,
+            "sample_rate": config.SAMPLE_RATE,
+            "frames_per_window": rolling.frames_per_window,
+            "hop_frames": rolling.hop_frames,
+            "vad": config.VAD_ENABLED
+        })
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                data = carry + message["bytes"]
+                usable = len(data) - len(data) % item_size
+                carry = data[usable:]
+                samples = np.multiply(np.frombuffer(data, dtype=dtype, count=usable // item_size), scale, dtype=np.float32)
+                await emit(await worker_pools.run_compute(push, samples))
+                if max_samples is not None and num_samples > max_samples:
+                    await websocket.send_json({"event": "error", "detail": f"Audio terlalu panjang. Maksimum: {config.MAX_AUDIO_SECONDS:.0f} detik."})
+                    await websocket.close(code=1009)
+                    return
+            elif (message.get("text") or "").strip().lower() == "end":
+                await emit(await worker_pools.run_compute(finish))
+                mean = np.mean(history, axis=0)
+                await websocket.send_json({
+                    "event": "selesai",
+                    "model": model_name,
+                    "prediksi": "Dysarthric" if mean[1] > mean[0] else "Control",
+                    "detail_probabilitas": {"Control": float(mean[0]), "Dysarthric": float(mean[1])},
+                    "jumlah_window": len(history),
+                    "durasi_audio_sample": num_samples,
+                    "vad": preprocessing.vad_report(num_samples, removed["start"], removed["end"]) if config.VAD_ENABLED else None
+                })
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        print(f"🔌 WebSocket {model_name} terputus")
+    finally:
+        worker_pools.release()
+
+@app.get("/inference/stats")
+def get_inference_stats():
+    """Statistik runtime inferensi (antrian & histogram ukuran batch per model) untuk tuning."""
+    return {
+        "batching": {name: batcher.stats() for name, batcher in batchers.items()},
+        "tracing": {name: inference_fn.stats() for name, inference_fn in model_registry.items()},
+        "registry": model_registry.stats(),
+        "result_cache": result_cache.stats(),
+        "workers": worker_pools.stats()
+    }
 
 # -------------------------------------------------------------------------
 # ENDPOINT: Engine Report - Overview
@@ -0,0 +1,210 @@
+import struct
+import subprocess
+import sys
+
+import numpy as np
+
+from . import config
+
+# WAVE format tags
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class UnsupportedSampleRateError(ValueError):
+    """
+    Sample rate outside [config.MIN_INPUT_SAMPLE_RATE, config.MAX_INPUT_SAMPLE_RATE]: a client error,
+    never a reason to fall back to another decoder.
+    """
+
+
+def check_sample_rate(sample_rate):
+    """
+    Rejects (UnsupportedSampleRateError) rates that would make the resampler design huge filters.
+    """
+    if not config.MIN_INPUT_SAMPLE_RATE <= int(sample_rate) <= config.MAX_INPUT_SAMPLE_RATE:
+        raise UnsupportedSampleRateError(
+            f"Unsupported sample rate {int(sample_rate)} Hz "
+            f"(allowed: {config.MIN_INPUT_SAMPLE_RATE}-{config.MAX_INPUT_SAMPLE_RATE} Hz)")
+    return int(sample_rate)
+
+
+def is_riff_wav(file_content):
+    """
+    Sniffs the RIFF/WAVE header (first 12 bytes) without parsing the whole file.
+    """
+    return len(file_content) >= 12 and file_content[:4] == b'RIFF' and file_content[8:12] == b'WAVE'
+
+
+def parse_wav_header(file_content, total_size=None):
+    """
+    Walks the RIFF chunks and returns the format description plus the location of the sample data.
+    `file_content` may be just the beginning of the file (header probe) if `total_size` gives the file size.
+    Returns: dict(format_tag, channels, sample_rate, bits_per_sample, block_align, data_offset, data_size)
+    """
+    if not is_riff_wav(file_content):
+        raise ValueError("Not a RIFF/WAVE file")
+
+    fmt = None
+    offset = 12
+    total = len(file_content) if total_size is None else total_size
+    while offset + 8 <= len(file_content):
+        chunk_id = file_content[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', file_content, offset + 4)[0]
+        body = offset + 8
+
+        if chunk_id == b'fmt ':
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from('<HHIIHH', file_content, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # SubFormat GUID: first 2 bytes carry the actual format tag
+                format_tag = struct.unpack_from('<H', file_content, body + 24)[0]
+            fmt = {
+                "format_tag": format_tag,
+                "channels": channels,
+                "sample_rate": sample_rate,
+                "bits_per_sample": bits,
+                "block_align": block_align
+            }
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("WAV 'data' chunk before 'fmt ' chunk")
+            # Streaming writers may leave the size at 0/0xFFFFFFFF: clamp to what is actually there
+            data_size = min(chunk_size, total - body)
+            data_size -= data_size % fmt["block_align"]
+            return dict(fmt, data_offset=body, data_size=data_size)
+
+        # Chunks are word aligned
+        offset = body + chunk_size + (chunk_size & 1)
+
+    raise ValueError("WAV file without 'fmt '/'data' chunk")
+
+
+def pcm_to_float(data, header):
+    """
+    Raw WAV sample bytes (whole frames) -> mono float32 in [-1, 1) (same scaling as tf.audio.decode_wav).
+    The bytes are viewed in place with np.frombuffer; the only allocation is the float32 conversion.
+    Supports integer PCM (8/16/24/32-bit) and IEEE float, mono is obtained by averaging channels.
+    """
+    format_tag = header["format_tag"]
+    bits = header["bits_per_sample"]
+    channels = header["channels"]
+
+    if format_tag == WAVE_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(data, dtype='<i2')
+        scale = 1.0 / 32768.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 32:
+        samples = np.frombuffer(data, dtype='<i4')
+        scale = 1.0 / 2147483648.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 8:
+        # 8-bit WAV is unsigned
+        samples = np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128
+        scale = 1.0 / 128.0
+    elif format_tag == WAVE_FORMAT_PCM and bits == 24:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        samples = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8) | (raw[:, 2].astype(np.int32) << 16))
+        samples = np.where(samples & 0x800000, samples - 0x1000000, samples)
+        scale = 1.0 / 8388608.0
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        samples = np.frombuffer(data, dtype='<f4' if bits == 32 else '<f8')
+        scale = 1.0
+    else:
+        raise ValueError(f"Unsupported WAV encoding (format_tag={format_tag}, bits={bits})")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+
+    return np.multiply(samples, scale, dtype=np.float32)
+
+
+class WavStreamDecoder:
+    """
+    Incremental WAV decoder for chunked uploads: feed() the bytes as they arrive and get the
+    float32 mono samples of every complete frame back. Between calls only the header (until it
+    is complete) and one partial frame are buffered.
+    Raises ValueError for non-WAV input, unsupported encodings, or a header larger than
+    MAX_HEADER_BYTES, so the caller can fall back to ffmpeg with the bytes it already read.
+    A sample rate outside the accepted range raises UnsupportedSampleRateError (no fallback).
+    """
+    MAX_HEADER_BYTES = 1 << 20
+
+    def __init__(self):
+        self.header = None
+        self.declared_frames = None  # from the 'data' chunk size; None when the writer left it unset
+        self._pending = b''
+        self._remaining = None
+
+    @property
+    def sample_rate(self):
+        return self.header["sample_rate"] if self.header is not None else None
+
+    def _parse_header(self, data):
+        try:
+            # Huge total_size: keep the data size declared in the header instead of clamping it to this chunk
+            header = parse_wav_header(data, total_size=sys.maxsize)
+        except (ValueError, struct.error, ZeroDivisionError):
+            if (len(data) >= 12 and not is_riff_wav(data)) or len(data) > self.MAX_HEADER_BYTES:
+                raise ValueError("Not a streamable RIFF/WAVE file")
+            return None
+        # Fails early (ValueError) on encodings pcm_to_float does not support / absurd header rates
+        pcm_to_float(b'', header)
+        check_sample_rate(header["sample_rate"])
+        # Streaming writers leave the size at 0 / 0xFFFFFFFF: read until the end of the upload instead
+        if 0 < header["data_size"] < 0xFFFFFFFF - header["block_align"]:
+            self.declared_frames = header["data_size"] // header["block_align"]
+            self._remaining = header["data_size"]
+        return header
+
+    def feed(self, chunk):
+        chunk = bytes(chunk)
+        if self.header is None:
+            data = self._pending + chunk
+            self.header = self._parse_header(data)
+            if self.header is None:
+                self._pending = data
+                return np.zeros((0,), dtype=np.float32)
+            self._pending = b''
+            chunk = data[self.header["data_offset"]:]
+
+        if self._remaining is not None:
+            # Chunks after 'data' (e.g. LIST metadata) are not samples
+            chunk = chunk[:self._remaining]
+            self._remaining -= len(chunk)
+
+        data = self._pending + chunk
+        usable = len(data) - len(data) % self.header["block_align"]
+        self._pending = data[usable:]
+        return pcm_to_float(memoryview(data)[:usable], self.header)
+
+    def finish(self):
+        # A trailing partial frame is dropped
+        if self.header is None:
+            raise ValueError("WAV header incomplete")
+
+
+def ffmpeg_command(sample_rate=config.SAMPLE_RATE):
+    """
+    ffmpeg reading any container/codec from stdin and writing raw 16-bit mono PCM at `sample_rate`
+    to stdout (ffmpeg also does the resampling). Used whole-file and streaming.
+    """
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-i', 'pipe:0',
+        '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(int(sample_rate)),
+        'pipe:1'
+    ]
+
+
+def decode_with_ffmpeg(file_content, sample_rate=config.SAMPLE_RATE):
+    """
+    Decodes compressed uploads (webm/ogg/mp3) by piping the bytes through ffmpeg straight to
+    raw 16-bit mono PCM at `sample_rate` (ffmpeg also does the resampling).
+    Module-level & TensorFlow-free so it can run inside the decode process pool.
+    Returns: (waveform float32 (T,), sample_rate)
+    """
+    result = subprocess.run(ffmpeg_command(sample_rate), input=file_content, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+
+    samples = np.frombuffer(result.stdout, dtype='<i2')
+    return np.multiply(samples, 1.0 / 32768.0, dtype=np.float32), int(sample_rate)
@@ -0,0 +1,127 @@
+import asyncio
+import collections
+
+import numpy as np
+
+from . import config
+
+
+class MicroBatcher:
+    """
+    Per-model request coalescer for the /predict endpoint.
+
+    Concurrent requests enqueue a single feature tensor (without batch dimension).
+    A background task collects up to `max_batch_size` tensors or waits at most
+    `max_wait_ms` after the first one arrives, runs ONE batched forward pass and
+    fans the per-sample results back to the waiting coroutines.
+    The forward pass runs on `executor` (None = loop default) so the event loop stays free.
+    `collate_fn` turns the list of queued samples into the batch passed to `predict_fn`
+    (default: np.stack of equally shaped feature tensors).
+    """
+
+    def __init__(self, predict_fn, max_batch_size=config.BATCH_MAX_SIZE, max_wait_ms=config.BATCH_MAX_WAIT_MS, name='model',
+                 executor=None, collate_fn=np.stack):
+        # predict_fn: callable collate_fn(samples) -> (B, num_classes) np.ndarray
+        self.predict_fn = predict_fn
+        self.collate_fn = collate_fn
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = None
+        self._worker = None
+
+        # Tuning statistics
+        self.total_requests = 0
+        self.total_batches = 0
+        self.max_queue_depth = 0
+        self.batch_size_hist = collections.Counter()
+        self.queue_depth_hist = collections.Counter()
+
+    def _ensure_worker(self):
+        # Queue & worker are created lazily so they bind to uvicorn's running loop
+        if self._worker is None or self._worker.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def predict(self, features):
+        """
+        Submit one sample and wait for its prediction row.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+
+        depth = self._queue.qsize()
+        self.queue_depth_hist[depth] += 1
+        self.max_queue_depth = max(self.max_queue_depth, depth + 1)
+        self.total_requests += 1
+
+        await self._queue.put((np.asarray(features), future))
+        return await future
+
+    async def _collect(self):
+        # Block for the first item, then keep collecting until batch full or window closed
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Requests whose client already went away do not need a forward pass
+            batch = [(x, fut) for x, fut in batch if not fut.cancelled()]
+            if not batch:
+                continue
+
+            self.total_batches += 1
+            self.batch_size_hist[len(batch)] += 1
+
+            try:
+                inputs = self.collate_fn([x for x, _ in batch])
+                outputs = await asyncio.get_running_loop().run_in_executor(self.executor, self.predict_fn, inputs)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            for (_, fut), row in zip(batch, outputs):
+                if not fut.done():
+                    fut.set_result(row)
+
+    def stats(self):
+        """
+        Snapshot of queue depth & batch size histograms (for tuning the window).
+        """
+        processed = sum(size * count for size, count in self.batch_size_hist.items())
+        return {
+            "model": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "avg_batch_size": (processed / self.total_batches) if self.total_batches else 0.0,
+            "batch_size_hist": {str(k): v for k, v in sorted(self.batch_size_hist.items())},
+            "queue_depth_hist": {str(k): v for k, v in sorted(self.queue_depth_hist.items())},
+        }
@@ -7,6 +7,18 @@ DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
 MODELS_DIR = os.path.join(PROJECT_ROOT, 'models')
 # Point to backend outputs (where generated JSON files live)
 OUTPUTS_DIR = os.path.join(PROJECT_ROOT, 'outputs')
+# On-disk feature cache for training (content hash + feature config -> memory-mapped .npy shards)
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR', os.path.join(PROJECT_ROOT, 'cache', 'features'))
+# Dataset discovery: persisted directory index + labelled manifest (later runs only re-list changed directories)
+DATASET_INDEX_DIR = os.environ.get('DATASET_INDEX_DIR', os.path.join(PROJECT_ROOT, 'cache', 'index'))
+DISCOVERY_WORKERS = int(os.environ.get('DISCOVERY_WORKERS', 16))
+# Packed WAV shards (tools/pack_wav_shards.py): target shard size & TFRecord readers interleaved per dataset
+SHARD_SIZE_MB = int(os.environ.get('SHARD_SIZE_MB', 256))
+SHARD_READ_PARALLELISM = int(os.environ.get('SHARD_READ_PARALLELISM', 8))
+SHARD_SHUFFLE_BUFFER = int(os.environ.get('SHARD_SHUFFLE_BUFFER', 2048))
+# Training notebook: if set, each split is packed under WAV_SHARD_DIR/<dataset>/<split> and read from shards
+# (raw-audio pipeline, no feature cache). Empty = read the WAV files directly.
+WAV_SHARD_DIR = os.environ.get('WAV_SHARD_DIR', '')
 
 # Audio Processing Parameters (Paper 2 Compliance: Native SR & Librosa Defaults)
 SAMPLE_RATE = 16000 # Increased from 8000 to match typical native speech rate
@@ -21,6 +33,17 @@ N_MFCC = 40
 MFCC_MAX_LEN = 174 # Fixed Input Width
 # Audio Length Calculation: (174 - 1) * 512 + 2048 = 90624 samples (~5.6s)
 AUDIO_MAX_LENGTH = (MFCC_MAX_LEN - 1) * STFT_STRIDE + STFT_WINDOW_SIZE
+# Bucketed (variable-length) pipeline: STFT frame counts each clip is padded up to (last = MFCC_MAX_LEN)
+BUCKET_FRAMES = [32, 64, 96, 128, MFCC_MAX_LEN]
+BUCKETED_TRAINING = os.environ.get('BUCKETED_TRAINING', '0') == '1'
+# Silence trimming (energy VAD) before featurisation, applied at decode time by training, /predict AND the WebSocket.
+# Frames more than VAD_THRESHOLD_DB below the clip's loudest frame are cut from both ends (VAD_MARGIN_MS kept).
+# Changes the features: models must be trained and served with the same setting.
+VAD_ENABLED = os.environ.get('VAD_ENABLED', '0') == '1'
+VAD_FRAME_MS = 25
+VAD_HOP_MS = 10
+VAD_THRESHOLD_DB = float(os.environ.get('VAD_THRESHOLD_DB', -40.0))
+VAD_MARGIN_MS = 100
 
 # Model Parameters
 BATCH_SIZE = 32
@@ -28,6 +51,8 @@ EPOCHS = 40
 LEARNING_RATE = 0.0001 # Reduced from 0.001 to stabilize CNN-STFT (Fix Sawtooth)
 PATIENCE = 40 # Set to EPOCHS to effectively disable Early Stopping (Paper 2 logic)
 OPTIMIZER = 'adam' # Matched to Paper 2
+# Training shuffle: full-dataset shuffle of the (path, label) index, reshuffled every epoch with this seed
+SHUFFLE_SEED = int(os.environ.get('SHUFFLE_SEED', 42))
 
 # Dataset Config
 # Command words to filter (Deprecated for Binary Class, kept empty)
@@ -40,3 +65,57 @@ MODELS = {
     'efficientnetb0': 'EfficientNetB0 (Benchmark)',
     'nasnetmobile': 'NASNetMobile (Benchmark)'
 }
+
+# Serving: Dynamic Micro-Batching (/predict)
+# Requests are coalesced per model up to BATCH_MAX_SIZE or BATCH_MAX_WAIT_MS, whichever comes first.
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+
+# Serving: Sliding-window mode (/predict/{model}?mode=window). Long uploads are cut into overlapping
+# AUDIO_MAX_LENGTH windows, WINDOW_HOP_SECONDS apart, and all windows go through the model as ONE batch.
+WINDOW_HOP_SECONDS = float(os.environ.get('WINDOW_HOP_SECONDS', 2.8))
+WINDOW_AGGREGATIONS = ('mean', 'max', 'vote')
+
+# Serving: Upload ingestion. Uploads are read & decoded in UPLOAD_CHUNK_BYTES chunks (never whole in memory);
+# audio longer than MAX_AUDIO_SECONDS is rejected with 413 as soon as that is known (0 = unlimited).
+# STREAM_WINDOW_BATCH: sliding windows featurised together while the upload is still streaming in.
+UPLOAD_CHUNK_BYTES = int(os.environ.get('UPLOAD_CHUNK_BYTES', 1 << 20))
+MAX_AUDIO_SECONDS = float(os.environ.get('MAX_AUDIO_SECONDS', 600))
+STREAM_WINDOW_BATCH = int(os.environ.get('STREAM_WINDOW_BATCH', 8))
+# Input sample rates accepted from WAV headers / the WebSocket `sample_rate` (anything else: 400 / close 1008)
+MIN_INPUT_SAMPLE_RATE = int(os.environ.get('MIN_INPUT_SAMPLE_RATE', 4000))
+MAX_INPUT_SAMPLE_RATE = int(os.environ.get('MAX_INPUT_SAMPLE_RATE', 384000))
+
+# Serving: Real-time WebSocket (/ws/predict/{model}). A prediction is emitted once the first MFCC_MAX_LEN STFT
+# frames are in, then every STREAM_HOP_FRAMES frames (32 * 512 samples ~ 1s at 16 kHz).
+STREAM_HOP_FRAMES = int(os.environ.get('STREAM_HOP_FRAMES', 32))
+
+# Serving: Batch prediction (/predict/{model}/batch). Files (or zip entries) accepted per request, and clips per
+# forward pass; at most 2 x BATCH_PREDICT_SIZE clips are decoded/held at once.
+BATCH_PREDICT_MAX_FILES = int(os.environ.get('BATCH_PREDICT_MAX_FILES', 512))
+BATCH_PREDICT_SIZE = int(os.environ.get('BATCH_PREDICT_SIZE', 32))
+# Zip bombs: bytes one zip entry may decompress to (MAX_AUDIO_SECONDS of stereo 16-bit audio at MAX_INPUT_SAMPLE_RATE,
+# + 1 MB of headers/metadata; 600 s when MAX_AUDIO_SECONDS is unlimited) and total uncompressed bytes per batch request
+# (files + zip entries); 413 above either.
+BATCH_ENTRY_MAX_BYTES = int(os.environ.get('BATCH_ENTRY_MAX_BYTES', (MAX_AUDIO_SECONDS or 600) * MAX_INPUT_SAMPLE_RATE * 2 * 2 + (1 << 20)))
+BATCH_PREDICT_MAX_BYTES = int(os.environ.get('BATCH_PREDICT_MAX_BYTES', 1 << 30))
+
+# Serving: Prediction result cache (LRU), keyed by (hash of the decoded PCM, model, weights file mtime).
+# Used by /predict (mode single), /predict/{model}/batch and /predict/ensemble. 0 entries = disabled, TTL 0 = no expiry.
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 4096))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get('RESULT_CACHE_TTL_SECONDS', 3600))
+
+# Serving: Models loaded & warmed up at startup (comma-separated subset of MODELS; empty = lazy loading)
+PRELOAD_MODELS = [m.strip() for m in os.environ.get('PRELOAD_MODELS', ','.join(MODELS.keys())).split(',') if m.strip()]
+
+# Serving: Model Registry (LRU). Caps resident models by count and/or total weight size; 0 = unlimited.
+MODEL_REGISTRY_MAX_MODELS = int(os.environ.get('MODEL_REGISTRY_MAX_MODELS', len(MODELS)))
+MODEL_REGISTRY_MAX_MB = int(os.environ.get('MODEL_REGISTRY_MAX_MB', 0))
+
+# Serving: Worker Pools & Backpressure
+# DECODE_WORKERS: processes driving ffmpeg for non-WAV uploads (0 = use the compute threads).
+# COMPUTE_WORKERS: threads for decode_wav, STFT/MFCC and inference.
+# MAX_PENDING_REQUESTS: in-flight /predict requests before answering 503 (0 = unlimited).
+DECODE_WORKERS = int(os.environ.get('DECODE_WORKERS', 2))
+COMPUTE_WORKERS = int(os.environ.get('COMPUTE_WORKERS', 4))
+MAX_PENDING_REQUESTS = int(os.environ.get('MAX_PENDING_REQUESTS', 64))
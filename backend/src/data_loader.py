@@ -1,22 +1,70 @@
 import os
 import tensorflow as tf
-import glob
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from . import config
 from . import preprocessing
+from . import feature_cache
+from . import dataset_index
+from . import wav_shards
 
 import re
 
+# Speaker ID patterns (compiled once). Matches: M01, F04, MC02, FC03, M1, F1 (case insensitive)
+# Note: UASpeech sometimes has M05 or M5.
+SPEAKER_ID_PATTERN = re.compile(r'([MF]C?\d+)', re.IGNORECASE)
+SPEAKER_DIR_PATTERN = re.compile(r'^[MF]C?\d+$', re.IGNORECASE)
+
+# TORGO Speakers (raw structure without explicit control/dysarthric folders)
+TORGO_CONTROL_IDS = frozenset({'FC01', 'FC02', 'FC03', 'MC01', 'MC02', 'MC03', 'MC04', 'CONTROL'})
+TORGO_DYSARTHRIC_IDS = frozenset({'F01', 'F03', 'F04', 'M01', 'M02', 'M03', 'M04', 'M05', 'DYSARTHRIC'})
+
+def _speaker_from_directory(directory):
+    # First speaker-like token in the directory path (what re.search over the full path finds
+    # first whenever the directory contains one), else the parent folder if it IS an ID
+    match = SPEAKER_ID_PATTERN.search(directory)
+    if match:
+        return match.group(1).upper()
+    parent = os.path.basename(directory)
+    if SPEAKER_DIR_PATTERN.match(parent):
+        return parent.upper()
+    return None
+
+def extract_speaker_ids(file_paths):
+    """
+    Speaker ID per file, resolved ONCE per directory (memoised by parent path).
+    Same result as searching the full path: a match inside the directory part always comes first;
+    only files in directories without an ID fall back to searching their own filename.
+    """
+    by_directory = {}
+    speaker_ids = []
+    for filepath in file_paths:
+        directory, filename = os.path.split(filepath)
+        if directory not in by_directory:
+            by_directory[directory] = _speaker_from_directory(directory)
+        speaker = by_directory[directory]
+        if speaker is None:
+            match = SPEAKER_ID_PATTERN.search(filename)
+            speaker = match.group(1).upper() if match else "UNKNOWN_SPEAKER"
+        speaker_ids.append(speaker)
+    return speaker_ids
+
+def _torgo_label_from_directory(directory):
+    # First path component found in the known lists decides (filenames carry an extension, never an ID)
+    for part in directory.split(os.sep):
+        part = part.upper()
+        if part in TORGO_CONTROL_IDS:
+            return 'control'
+        if part in TORGO_DYSARTHRIC_IDS:
+            return 'dysarthric'
+    return None
+
 def get_file_paths(dataset_root, dataset_name='UASpeech'):
     """
     Parses file paths and labels from dataset directories.
     Target: BINARY Classification (Control vs Dysarthric).
     Label Convention: 0 = Control, 1 = Dysarthric.
     """
-    file_paths = []
-    labels = []
-    
     # Define paths for Control and Dysarthric folders
     # Structure: dataset_root/control/*.wav AND dataset_root/dysarthric/*.wav
     # This matches the structure seen in Paper 2 code.
@@ -47,17 +95,16 @@ def get_file_paths(dataset_root, dataset_name='UASpeech'):
             print(f"[{dataset_name}] CRITICAL: Valid dataset directory not found!")
             return [], []
 
-    # Check 1: Explicit 'control' and 'dysarthric' folders with flexible globbing (case insensitive ext)
-    # Using recursive glob with case insensitive extension pattern is tricky in glob.
-    # We will search for *.wav and *.WAV
-    
-    control_pattern_lower = os.path.join(dataset_root, 'control', '**', '*.wav')
-    control_pattern_upper = os.path.join(dataset_root, 'control', '**', '*.WAV')
-    dysarthric_pattern_lower = os.path.join(dataset_root, 'dysarthric', '**', '*.wav')
-    dysarthric_pattern_upper = os.path.join(dataset_root, 'dysarthric', '**', '*.WAV')
+    # Single concurrent os.scandir pass over the whole root (extensions matched case-insensitively),
+    # persisted so later runs only re-list directories that changed. Replaces the 4-6 recursive globs.
+    indexed = dataset_index.index_audio_files(dataset_root, dataset_name)
+    file_info = {path: (size, mtime_ns) for path, size, mtime_ns in indexed}
     
-    control_files = glob.glob(control_pattern_lower, recursive=True) + glob.glob(control_pattern_upper, recursive=True)
-    dysarthric_files = glob.glob(dysarthric_pattern_lower, recursive=True) + glob.glob(dysarthric_pattern_upper, recursive=True)
+    # Check 1: Explicit 'control' and 'dysarthric' folders (any depth below them)
+    control_prefix = os.path.join(dataset_root, 'control') + os.sep
+    dysarthric_prefix = os.path.join(dataset_root, 'dysarthric') + os.sep
+    control_files = [path for path, _, _ in indexed if path.startswith(control_prefix)]
+    dysarthric_files = [path for path, _, _ in indexed if path.startswith(dysarthric_prefix)]
     
     # Check 2: Raw TORGO Structure (Speaker IDs) if explicit folders are empty
     # TORGO Speakers:
@@ -66,8 +113,7 @@ def get_file_paths(dataset_root, dataset_name='UASpeech'):
     if dataset_name == 'TORGO' and len(control_files) == 0 and len(dysarthric_files) == 0:
         print(f"[{dataset_name}] Explicit split not found. Scanning for Speaker IDs in {dataset_root}...")
         
-        all_wavs = glob.glob(os.path.join(dataset_root, '**', '*.wav'), recursive=True) + \
-                   glob.glob(os.path.join(dataset_root, '**', '*.WAV'), recursive=True)
+        all_wavs = [path for path, _, _ in indexed]
         
         # Debug: if still 0, print what directories exist
         if len(all_wavs) == 0:
@@ -82,112 +128,134 @@ def get_file_paths(dataset_root, dataset_name='UASpeech'):
             except Exception as e:
                 print(f"Error listing dirs: {e}")
         
+        # Heuristic: Check for Speaker ID in path parts
+        # Control usually has 'C' in ID like FC01, MC01 or 'Control' in path
+        # Dysarthric is F01, M01 etc (without C)
+        # Resolved once per directory, not once per file
+        label_by_directory = {}
         for f in all_wavs:
-            # Check identifying parts in the path
-            path_parts = f.split(os.sep)
-            filename = os.path.basename(f)
+            directory = os.path.dirname(f)
+            if directory not in label_by_directory:
+                label_by_directory[directory] = _torgo_label_from_directory(directory)
+            label = label_by_directory[directory]
             
-            # Heuristic: Check for Speaker ID in path parts
-            # Control usually has 'C' in ID like FC01, MC01 or 'Control' in path
-            # Dysarthric is F01, M01 etc (without C)
-            
-            is_control = False
-            is_dysarthric = False
-            
-            # Simple check against known lists or patterns
-            for part in path_parts:
-                part = part.upper()
-                if part in ['FC01', 'FC02', 'FC03', 'MC01', 'MC02', 'MC03', 'MC04', 'CONTROL']:
-                    is_control = True
-                    break
-                elif part in ['F01', 'F03', 'F04', 'M01', 'M02', 'M03', 'M04', 'M05', 'DYSARTHRIC']:
-                    is_dysarthric = True
-                    break
-            
-            if is_control:
+            if label == 'control':
                 control_files.append(f)
-            elif is_dysarthric:
+            elif label == 'dysarthric':
                 dysarthric_files.append(f)
             # Else ignore (maybe random system files)
 
     print(f"[{dataset_name}] Found {len(control_files)} Control files.")
     print(f"[{dataset_name}] Found {len(dysarthric_files)} Dysarthric files.")
     
-    # Extract Speaker IDs Helper
-    def extract_speaker_id(filepath):
-        # Naive Heuristic: Search for patterns like M01, F03, MC01, FC02
-        # TORGO: F01, M02, FC01 (Control often has C)
-        # S01.. etc.
-        # Strategy: Look for the parent folder or filename parts
-        parts = filepath.split(os.sep)
-        filename = os.path.basename(filepath)
-        
-        # Regex for common Speaker ID patterns in these datasets
-        # Matches: M01, F04, MC02, FC03, M1, F1 (case insensitive)
-        # Note: UASpeech sometimes has M05 or M5.
-        match = re.search(r'([MF]C?\d+)', filepath, re.IGNORECASE)
-        if match:
-            return match.group(1).upper()
-        
-        # Fallback: Use parent folder name if it looks like an ID
-        parent = parts[-2] if len(parts) > 1 else ""
-        if re.match(r'^[MF]C?\d+$', parent, re.IGNORECASE):
-            return parent.upper()
-            
-        return "UNKNOWN_SPEAKER"
-
-    speaker_ids = []
-
     # Assign Labels
-    # Control -> 0
-    for f in control_files:
-        file_paths.append(f)
-        labels.append('control') # Mapped to 0 later
-        speaker_ids.append(extract_speaker_id(f))
-        
-    # Dysarthric -> 1
-    for f in dysarthric_files:
-        file_paths.append(f)
-        labels.append('dysarthric') # Mapped to 1 later
-        speaker_ids.append(extract_speaker_id(f))
+    # Control -> 0, Dysarthric -> 1 (mapped later)
+    file_paths = control_files + dysarthric_files
+    labels = ['control'] * len(control_files) + ['dysarthric'] * len(dysarthric_files)
+    speaker_ids = extract_speaker_ids(file_paths)
+    
+    # Persist the labelled manifest (path, size, mtime, label, speaker)
+    dataset_index.write_manifest(dataset_root, dataset_name, [
+        (f, file_info[f][0], file_info[f][1], label, speaker)
+        for f, label, speaker in zip(file_paths, labels, speaker_ids)
+    ])
             
     return file_paths, labels, speaker_ids
 
-def create_tf_dataset(file_paths, labels, class_mapping, batch_size=config.BATCH_SIZE, is_training=False, feature_type='stft'):
+def create_tf_dataset(file_paths, labels, class_mapping, batch_size=config.BATCH_SIZE, is_training=False, feature_type='stft',
+                      cache_dir=None, shard_dir=None, bucketed=False):
     """
     Creates a tf.data.Dataset from file paths and labels.
+    cache_dir: if set, features come from the on-disk FeatureCache (computed once, then memory-mapped)
+    instead of being decoded and featurised again on every epoch.
+    shard_dir: if set, the WAVs are read from TFRecord shards packed by tools/pack_wav_shards.py
+    (interleaved sequential reads) instead of opening every file.
+    bucketed: group clips by length (config.BUCKET_FRAMES) and compute the STFT only up to each
+    bucket's frame count, so features have a variable time axis (models.supports_variable_length).
+    Not combined with cache_dir (the cache stores fixed-length features).
     """
     # Convert labels to integers
     label_indices = [class_mapping[l] for l in labels]
     
-    # Create dataset of paths/labels
-    dataset = tf.data.Dataset.from_tensor_slices((file_paths, label_indices))
+    if cache_dir and not bucketed:
+        return _create_cached_dataset(file_paths, label_indices, batch_size, is_training, feature_type, cache_dir)
     
-    # Map preprocessing function
-    def process_path(file_path, label):
-        # Load and preprocess
-        # Output shape from preprocessing: (Height, Width, 1) -> Already has Channel dim
-        features = preprocessing.load_and_preprocess_wav(file_path, feature_type=feature_type)
+    if shard_dir:
+        # Shard mode: (audio, length, label) straight from the packed shards
+        dataset = wav_shards.read_shards(shard_dir, file_paths, label_indices, is_training=is_training)
+    else:
+        # Create dataset of paths/labels
+        # Explicit dtypes: an empty split would otherwise be inferred as float32
+        dataset = tf.data.Dataset.from_tensor_slices((tf.constant(file_paths, dtype=tf.string), tf.constant(label_indices, dtype=tf.int32)))
         
-        # Add channel dimension logic
-        if feature_type == 'mfcc':
-            # MFCC comes as (F, T, 1). We need (F, T, 3) for Transfer Learning.
-            # Use CONCAT, not STACK. 
-            # (F,T,1) + (F,T,1) + (F,T,1) -> (F,T,3) via concat axis -1.
-            features = tf.concat([features, features, features], axis=-1)
-        else:
-            # CNN-STFT expects (F, T, 1). 
-            # Preprocessing already returns (F, T, 1), so do NOTHING.
-            pass
-            
-        return features, label
+        if is_training:
+            # Shuffle the lightweight (path, label) index BEFORE decoding: the buffer covers the whole
+            # dataset (a few bytes per element), seeded for reproducible runs, new order every epoch
+            dataset = dataset.shuffle(buffer_size=max(1, len(label_indices)), seed=config.SHUFFLE_SEED, reshuffle_each_iteration=True)
+        
+        # Map: decode only (trimmed to AUDIO_MAX_LENGTH), features are computed per BATCH below
+        def process_path(file_path, label):
+            audio = preprocessing.load_wav(file_path, max_len=config.AUDIO_MAX_LENGTH)
+            return audio, tf.shape(audio)[0], label
+        
+        dataset = dataset.map(process_path, num_parallel_calls=tf.data.AUTOTUNE)
+    
+    if bucketed:
+        # Batch clips of similar length; each batch is zero-padded only up to its bucket's sample
+        # length (pad_to_bucket_boundary pads to boundary - 1), which yields exactly BUCKET_FRAMES[i] frames
+        bucket_lengths = preprocessing.get_feature_extractor().bucket_lengths(config.BUCKET_FRAMES)
+        boundaries = [length + 1 for length in bucket_lengths]
+        dataset = dataset.bucket_by_sequence_length(
+            element_length_func=lambda audio, length, label: length,
+            bucket_boundaries=boundaries,
+            bucket_batch_sizes=[batch_size] * (len(boundaries) + 1),
+            padded_shapes=([None], [], []),
+            pad_to_bucket_boundary=True
+        )
+    else:
+        # Zero-pad every clip to the fixed ~5.6s window, keep the true lengths for masking
+        dataset = dataset.padded_batch(batch_size, padded_shapes=([config.AUDIO_MAX_LENGTH], [], []))
     
-    dataset = dataset.map(process_path, num_parallel_calls=tf.data.AUTOTUNE)
+    # Batch-native feature extraction: one tf.signal.stft call per batch
+    def process_batch(audio, lengths, labels):
+        # Output shape from preprocessing: (B, Height, Width, 1) -> Already has Channel dim
+        # Transfer Learning models broadcast MFCC to 3 channels inside the graph, so no copy here.
+        features = preprocessing.get_features_batch(audio, lengths, feature_type=feature_type, variable_length=bucketed)
+        return features, labels
+    
+    dataset = dataset.map(process_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.prefetch(buffer_size=tf.data.AUTOTUNE)
+    
+    return dataset
+
+def precompute_features(file_paths, cache_dir=None, feature_types=('stft', 'mfcc'), batch_size=config.BATCH_SIZE):
+    """
+    Decodes every file ONCE and writes all requested feature views (STFT-Mel + MFCC) to the feature cache.
+    Call before the per-model loop: each create_tf_dataset(..., cache_dir=...) afterwards just selects its view.
+    """
+    return feature_cache.materialize_features(cache_dir or config.FEATURE_CACHE_DIR, list(file_paths), feature_types, batch_size)
+
+def _create_cached_dataset(file_paths, label_indices, batch_size, is_training, feature_type, cache_dir):
+    # Compute missing features once, then every epoch only reads (shard, row) slices of the memmaps
+    cache = feature_cache.FeatureCache(cache_dir, feature_type)
+    shard_ids, rows = cache.materialize(file_paths, batch_size=batch_size)
+    # Empty split on an empty cache: no shape recorded yet (the dataset yields nothing anyway)
+    feature_shape = cache.feature_shape or (None, None, 1)
+    
+    dataset = tf.data.Dataset.from_tensor_slices((shard_ids, rows, tf.constant(label_indices, dtype=tf.int32)))
     
     if is_training:
-        dataset = dataset.shuffle(buffer_size=1000)
+        # (shard, row, label) index is tiny: shuffle the whole dataset, seeded, reshuffled every epoch
+        dataset = dataset.shuffle(buffer_size=max(1, len(label_indices)), seed=config.SHUFFLE_SEED, reshuffle_each_iteration=True)
     
     dataset = dataset.batch(batch_size)
+    
+    def load_batch(shard_ids, rows, labels):
+        features = tf.numpy_function(cache.gather, [shard_ids, rows], tf.float32)
+        features.set_shape((None,) + feature_shape)
+        return features, labels
+    
+    dataset = dataset.map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
     dataset = dataset.prefetch(buffer_size=tf.data.AUTOTUNE)
     
     return dataset
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from . import config
+
+AUDIO_EXTENSIONS = ('.wav',)
+
+
+def _scan_directory(path, cached, extensions):
+    """
+    Lists ONE directory with os.scandir (file sizes/mtimes come from the same syscall batch).
+    Directories whose mtime did not change since the cached listing are not listed again.
+    Returns: (entry, rescanned) or (None, False) if the directory disappeared.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None, False
+    if cached is not None and cached["mtime_ns"] == mtime_ns:
+        return cached, False
+
+    subdirs, files = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                # Hidden entries are skipped, like glob('**') did
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                elif entry.name.lower().endswith(extensions):
+                    st = entry.stat()
+                    files.append([entry.name, st.st_size, st.st_mtime_ns])
+    except OSError:
+        return None, False
+    return {"mtime_ns": mtime_ns, "subdirs": sorted(subdirs), "files": sorted(files)}, True
+
+
+def scan_tree(root, state=None, extensions=AUDIO_EXTENSIONS, workers=config.DISCOVERY_WORKERS):
+    """
+    Concurrent single-pass walk of `root` (directories are listed in parallel, which is what
+    matters on network mounts where every listing is a round trip).
+    `state` is the result of a previous scan: unchanged directories reuse their listing.
+    Returns: (state {dir: {"mtime_ns", "subdirs", "files"}}, number of directories listed)
+    """
+    state = state or {}
+    extensions = tuple(ext.lower() for ext in extensions)
+    new_state = {}
+    rescanned = 0
+
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        pending = {pool.submit(_scan_directory, root, state.get(root), extensions): root}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                entry, listed = future.result()
+                if entry is None:
+                    continue
+                new_state[path] = entry
+                rescanned += listed
+                for name in entry["subdirs"]:
+                    subdir = os.path.join(path, name)
+                    if subdir not in new_state:
+                        pending[pool.submit(_scan_directory, subdir, state.get(subdir), extensions)] = subdir
+
+    return new_state, rescanned
+
+
+def iter_files(state):
+    """
+    (path, size, mtime_ns) for every indexed file, sorted by path (deterministic order).
+    """
+    files = []
+    for directory, entry in state.items():
+        for name, size, mtime_ns in entry["files"]:
+            files.append((os.path.join(directory, name), size, mtime_ns))
+    files.sort()
+    return files
+
+
+def _index_paths(dataset_root, dataset_name, index_dir):
+    key = hashlib.sha1(os.path.abspath(dataset_root).encode('utf-8')).hexdigest()[:10]
+    prefix = os.path.join(index_dir, f"{dataset_name}_{key}")
+    return prefix + '_dirs.json', prefix + '_manifest.csv'
+
+
+def index_audio_files(dataset_root, dataset_name, index_dir=None):
+    """
+    Indexes every audio file under `dataset_root`, reusing the directory listings persisted by the
+    previous run (only directories whose mtime changed are listed again).
+    Note: a directory's mtime changes when entries are added/removed/renamed, not when a file is
+    rewritten in place.
+    Returns: sorted list of (path, size, mtime_ns)
+    """
+    index_dir = index_dir or config.DATASET_INDEX_DIR
+    state_path, _ = _index_paths(dataset_root, dataset_name, index_dir)
+
+    previous = None
+    try:
+        with open(state_path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    state, rescanned = scan_tree(dataset_root, previous)
+    print(f"[{dataset_name}] Index: {len(state)} directories ({rescanned} listed, {len(state) - rescanned} cached)")
+
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+    except OSError as e:
+        print(f"[{dataset_name}] Warning: could not persist index to {index_dir}: {e}")
+
+    return iter_files(state)
+
+
+def write_manifest(dataset_root, dataset_name, records, index_dir=None):
+    """
+    Persists the labelled manifest (path, size, mtime_ns, label, speaker) next to the directory index.
+    Returns: manifest path, or None if the index directory is not writable.
+    """
+    index_dir = index_dir or config.DATASET_INDEX_DIR
+    _, manifest_path = _index_paths(dataset_root, dataset_name, index_dir)
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        pd.DataFrame(records, columns=['path', 'size', 'mtime_ns', 'label', 'speaker']).to_csv(manifest_path, index=False)
+    except OSError as e:
+        print(f"[{dataset_name}] Warning: could not write manifest to {index_dir}: {e}")
+        return None
+    return manifest_path
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+from . import config
+from . import preprocessing
+
+# Bump when the feature computation changes in a way the config values below do not capture
+FEATURE_CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1 << 20
+HASH_WORKERS = 8
+
+
+def feature_config(feature_type):
+    """
+    Every parameter that changes the cached feature values. Part of the cache key,
+    so editing any of them in config.py (or overriding them in a notebook) invalidates the cache.
+    """
+    params = {
+        "version": FEATURE_CACHE_VERSION,
+        "feature_type": feature_type,
+        "sample_rate": config.SAMPLE_RATE,
+        "n_fft": config.N_FFT,
+        "window_size": config.STFT_WINDOW_SIZE,
+        "stride": config.STFT_STRIDE,
+        "n_mfcc": config.N_MFCC,
+        "stft_mel_bins": preprocessing.STFT_MEL_BINS,
+        "max_len": config.MFCC_MAX_LEN,
+        "audio_max_length": config.AUDIO_MAX_LENGTH
+    }
+    # Only present when enabled: caches built without silence trimming keep their key
+    if config.VAD_ENABLED:
+        params["vad"] = preprocessing.vad_params()
+    return params
+
+
+def feature_config_key(feature_type):
+    blob = json.dumps(feature_config(feature_type), sort_keys=True).encode('utf-8')
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+def file_digest(file_path):
+    """
+    SHA-1 of the file CONTENT: renamed/copied files (e.g. a re-extracted dataset zip) still hit the cache.
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path, obj):
+    # Write + rename so an interrupted run never leaves a truncated index behind
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f)
+    os.replace(tmp_path, path)
+
+
+class FeatureCache:
+    """
+    Content-addressed on-disk cache of STFT / MFCC features for the training pipeline.
+
+    Layout (under `cache_dir`):
+      digests.json                 path -> [size, mtime_ns, sha1], avoids re-hashing unchanged files
+      <feature_type>-<config_key>/
+        index.json                 sha1 -> [shard, row]
+        shard_00000.npy, ...       (N, H, W, 1) float32, opened memory-mapped
+
+    Features are computed once (first epoch of the first model / notebook run) and
+    afterwards only read back, so epochs and models no longer decode WAVs or run the STFT.
+    """
+
+    def __init__(self, cache_dir, feature_type='stft'):
+        self.cache_dir = cache_dir
+        self.feature_type = feature_type
+        self.key = feature_config_key(feature_type)
+        self.directory = os.path.join(cache_dir, f"{feature_type}-{self.key}")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._digests_path = os.path.join(cache_dir, 'digests.json')
+        self._index_path = os.path.join(self.directory, 'index.json')
+        self.index = _read_json(self._index_path, None) or {
+            "config": feature_config(feature_type),
+            "feature_shape": None,
+            "shards": [],
+            "rows": {}
+        }
+        self._shards = []
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def feature_shape(self):
+        shape = self.index["feature_shape"]
+        return tuple(shape) if shape is not None else None
+
+    def digests(self, file_paths):
+        """
+        Content hash per path; files whose (size, mtime) did not change reuse the stored hash.
+        """
+        memo = _read_json(self._digests_path, {})
+        result = [None] * len(file_paths)
+        todo = []
+        for i, path in enumerate(file_paths):
+            key = os.path.abspath(path)
+            st = os.stat(key)
+            entry = memo.get(key)
+            if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                result[i] = entry[2]
+            else:
+                todo.append((i, key, st))
+
+        if todo:
+            # hashlib releases the GIL on large buffers: threads overlap I/O and hashing
+            with ThreadPoolExecutor(HASH_WORKERS) as pool:
+                for (i, key, st), digest in zip(todo, pool.map(file_digest, [key for _, key, _ in todo])):
+                    memo[key] = [st.st_size, st.st_mtime_ns, digest]
+                    result[i] = digest
+            _write_json(self._digests_path, memo)
+        return result
+
+    def materialize(self, file_paths, batch_size=config.BATCH_SIZE):
+        """
+        Makes sure every file has cached features (computing only the missing ones into a new shard).
+        Returns: (shard_ids int32 (N,), rows int64 (N,)) locating each file's features.
+        """
+        digests = self.digests(file_paths)
+        _fill_caches([self], file_paths, digests, batch_size)
+        return self.locate(digests)
+
+    def locate(self, digests):
+        rows = self.index["rows"]
+        locations = np.array([rows[digest] for digest in digests], dtype=np.int64).reshape(-1, 2)
+        return locations[:, 0].astype(np.int32), locations[:, 1]
+
+    def _missing(self, file_paths, digests):
+        # digest -> path of the files without cached features (duplicates computed once)
+        rows = self.index["rows"]
+        missing = {}
+        for path, digest in zip(file_paths, digests):
+            if digest not in rows and digest not in missing:
+                missing[digest] = path
+        return missing
+
+    def _add_shard(self, shard_name, feature_shape, digests):
+        shard_id = len(self.index["shards"])
+        self.index["shards"].append(shard_name)
+        self.index["feature_shape"] = list(feature_shape)
+        for row, digest in enumerate(digests):
+            self.index["rows"][digest] = [shard_id, row]
+        _write_json(self._index_path, self.index)
+
+    def _open_shards(self):
+        # Opened up-front (not lazily) so gather() is safe to call from parallel dataset.map threads
+        for name in self.index["shards"][len(self._shards):]:
+            self._shards.append(np.load(os.path.join(self.directory, name), mmap_mode='r'))
+
+    def gather(self, shard_ids, rows):
+        """
+        Reads a batch of cached feature rows: (B,) shard ids + (B,) rows -> (B, H, W, 1) float32.
+        """
+        out = np.empty((len(rows),) + self.feature_shape, dtype=np.float32)
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            out[mask] = self._shards[shard_id][rows[mask]]
+        return out
+
+
+class _ShardWriter:
+    """
+    Streams feature batches into a new memory-mapped shard; registered in the index on close().
+    """
+
+    def __init__(self, cache, digests):
+        self.cache = cache
+        self.digests = digests
+        self.shard_name = f"shard_{len(cache.index['shards']):05d}.npy"
+        self.shard_path = os.path.join(cache.directory, self.shard_name)
+        self.tmp_path = self.shard_path + '.tmp.npy'
+        self.shard = None
+        self.offset = 0
+
+    def append(self, features):
+        if self.shard is None:
+            self.shard = np.lib.format.open_memmap(self.tmp_path, mode='w+', dtype=np.float32,
+                                                   shape=(len(self.digests),) + features.shape[1:])
+        self.shard[self.offset:self.offset + len(features)] = features
+        self.offset += len(features)
+
+    def close(self):
+        self.shard.flush()
+        feature_shape = self.shard.shape[1:]
+        self.shard = None
+        os.replace(self.tmp_path, self.shard_path)
+        self.cache._add_shard(self.shard_name, feature_shape, self.digests)
+
+
+def _compute_features(file_paths, feature_types, batch_size):
+    # Same decode + batch featurisation as the uncached pipeline in data_loader.create_tf_dataset,
+    # except that every requested feature type comes out of the same decoded batch
+    def decode(file_path):
+        audio = preprocessing.load_wav(file_path, max_len=config.AUDIO_MAX_LENGTH)
+        return audio, tf.shape(audio)[0]
+
+    dataset = tf.data.Dataset.from_tensor_slices(file_paths)
+    dataset = dataset.map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.padded_batch(batch_size, padded_shapes=([config.AUDIO_MAX_LENGTH], []))
+    dataset = dataset.map(
+        lambda audio, lengths: preprocessing.get_features_multi(audio, lengths, feature_types),
+        num_parallel_calls=tf.data.AUTOTUNE
+    )
+    dataset = dataset.prefetch(tf.data.AUTOTUNE)
+    for features in dataset:
+        yield {feature_type: value.numpy() for feature_type, value in features.items()}
+
+
+def _fill_caches(caches, file_paths, digests, batch_size):
+    # One decode pass over the union of the files any cache is missing
+    missing = [cache._missing(file_paths, digests) for cache in caches]
+    union = {}
+    for cache_missing in missing:
+        union.update(cache_missing)
+
+    unique_files = len(set(digests))
+    for cache, cache_missing in zip(caches, missing):
+        cache.misses = len(cache_missing)
+        cache.hits = unique_files - cache.misses
+
+    if union:
+        union_digests = list(union)
+        # Rows are appended in union order (filtered per cache): each shard's digests must follow that same order
+        jobs = [(cache, cache_missing, _ShardWriter(cache, [d for d in union_digests if d in cache_missing]))
+                for cache, cache_missing in zip(caches, missing) if cache_missing]
+        feature_types = [cache.feature_type for cache, _, _ in jobs]
+
+        offset = 0
+        for batch in _compute_features(list(union.values()), feature_types, batch_size):
+            batch_digests = union_digests[offset:offset + len(batch[feature_types[0]])]
+            offset += len(batch_digests)
+            for cache, cache_missing, writer in jobs:
+                features = batch[cache.feature_type]
+                if len(cache_missing) != len(union):
+                    features = features[np.array([digest in cache_missing for digest in batch_digests])]
+                writer.append(features)
+
+        for _, _, writer in jobs:
+            writer.close()
+
+    for cache in caches:
+        print(f"💾 Feature cache [{cache.feature_type}]: {cache.hits} hit, {cache.misses} computed -> {cache.directory}")
+        cache._open_shards()
+
+
+def materialize_features(cache_dir, file_paths, feature_types=('stft', 'mfcc'), batch_size=config.BATCH_SIZE):
+    """
+    Fills the caches of several feature types with ONE decode per file (e.g. STFT for CNN-STFT and
+    MFCC for the transfer-learning models). Later create_tf_dataset(cache_dir=...) calls only read.
+    Returns: {feature_type: FeatureCache}
+    """
+    caches = [FeatureCache(cache_dir, feature_type) for feature_type in feature_types]
+    if not caches:
+        return {}
+    digests = caches[0].digests(file_paths)
+    _fill_caches(caches, file_paths, digests, batch_size)
+    return {cache.feature_type: cache for cache in caches}
@@ -0,0 +1,239 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import audio_io
+from . import config
+
+# Enough for the RIFF/fmt chunks of almost every WAV; files with large chunks before 'data' are re-read fully
+HEADER_PROBE_BYTES = 4096
+
+
+def read_wav_info(file_path):
+    """
+    WAV metadata from the header only (no sample decoding).
+    Returns: (size, sample_rate, data_offset, data_size, duration_sec); zeros/NaN where unreadable.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            head = f.read(HEADER_PROBE_BYTES)
+            try:
+                header = audio_io.parse_wav_header(head, total_size=size)
+            except (ValueError, struct.error):
+                if size <= len(head):
+                    raise
+                f.seek(0)
+                header = audio_io.parse_wav_header(f.read(), total_size=size)
+    except (OSError, ValueError, struct.error, ZeroDivisionError):
+        return 0, 0, 0, 0, float('nan')
+
+    frames = header["data_size"] // header["block_align"] if header["block_align"] else 0
+    duration = frames / header["sample_rate"] if header["sample_rate"] else float('nan')
+    return size, header["sample_rate"], header["data_offset"], header["data_size"], duration
+
+
+class Manifest:
+    """
+    Columnar dataset manifest (one NumPy array per column) replacing the parallel
+    file_paths / labels / speaker_ids lists returned by data_loader.get_file_paths.
+
+    - label / speaker are categorical: int32 codes + `*_names` lookup tables
+    - sizes, sample_rates, data_offsets (byte offset of the PCM data), data_sizes, durations
+      come from the WAV headers (read concurrently, no decoding)
+    - grouped lookups by label / speaker are O(1) slices of a precomputed sort order,
+      so splits, sampling and stats are vectorised instead of Python loops over every path
+    """
+
+    def __init__(self, paths, label_codes, label_names, speaker_codes, speaker_names,
+                 sizes=None, sample_rates=None, data_offsets=None, data_sizes=None, durations=None):
+        n = len(paths)
+        self.paths = np.asarray(paths, dtype=object)
+        self.label_codes = np.asarray(label_codes, dtype=np.int32)
+        self.label_names = np.asarray(label_names, dtype=object)
+        self.speaker_codes = np.asarray(speaker_codes, dtype=np.int32)
+        self.speaker_names = np.asarray(speaker_names, dtype=object)
+        self.sizes = np.zeros(n, np.int64) if sizes is None else np.asarray(sizes, dtype=np.int64)
+        self.sample_rates = np.zeros(n, np.int32) if sample_rates is None else np.asarray(sample_rates, dtype=np.int32)
+        self.data_offsets = np.zeros(n, np.int64) if data_offsets is None else np.asarray(data_offsets, dtype=np.int64)
+        self.data_sizes = np.zeros(n, np.int64) if data_sizes is None else np.asarray(data_sizes, dtype=np.int64)
+        self.durations = np.full(n, np.nan, np.float32) if durations is None else np.asarray(durations, dtype=np.float32)
+        self._groups = {}
+
+    @classmethod
+    def from_lists(cls, file_paths, labels, speaker_ids, read_headers=True, workers=config.DISCOVERY_WORKERS):
+        """
+        Builds the manifest from get_file_paths() output (optionally reading every WAV header).
+        """
+        label_names, label_codes = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+        speaker_names, speaker_codes = np.unique(np.asarray(speaker_ids, dtype=object).astype(str), return_inverse=True)
+        columns = {}
+        if read_headers and len(file_paths):
+            with ThreadPoolExecutor(max(1, workers)) as pool:
+                info = list(pool.map(read_wav_info, file_paths, chunksize=64))
+            sizes, sample_rates, data_offsets, data_sizes, durations = zip(*info)
+            columns = dict(sizes=sizes, sample_rates=sample_rates, data_offsets=data_offsets,
+                           data_sizes=data_sizes, durations=durations)
+        return cls(file_paths, label_codes, label_names.astype(object), speaker_codes, speaker_names.astype(object), **columns)
+
+    @classmethod
+    def read_csv(cls, path):
+        frame = pd.read_csv(path)
+        labels = pd.Categorical(frame['label'].astype(str))
+        speakers = pd.Categorical(frame['speaker'].astype(str))
+        optional = {col: frame[col].to_numpy() for col in ('sizes', 'sample_rates', 'data_offsets', 'data_sizes', 'durations')
+                    if col in frame}
+        if 'size' in frame and 'sizes' not in optional:
+            optional['sizes'] = frame['size'].to_numpy()
+        return cls(frame['path'].to_numpy(dtype=object), labels.codes, np.asarray(labels.categories, dtype=object),
+                   speakers.codes, np.asarray(speakers.categories, dtype=object), **optional)
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'path': self.paths,
+            'label': self.labels,
+            'speaker': self.speakers,
+            'sizes': self.sizes,
+            'sample_rates': self.sample_rates,
+            'data_offsets': self.data_offsets,
+            'data_sizes': self.data_sizes,
+            'durations': self.durations
+        })
+
+    def to_csv(self, path):
+        self.to_frame().to_csv(path, index=False)
+
+    def __len__(self):
+        return len(self.paths)
+
+    @property
+    def labels(self):
+        return self.label_names[self.label_codes]
+
+    @property
+    def speakers(self):
+        return self.speaker_names[self.speaker_codes]
+
+    def to_lists(self):
+        """
+        The (file_paths, labels, speaker_ids) triple the rest of the pipeline consumes.
+        """
+        return list(self.paths), list(self.labels), list(self.speakers)
+
+    def _group(self, column):
+        # Stable argsort by code + boundaries: rows of category c are order[bounds[c]:bounds[c + 1]]
+        if column not in self._groups:
+            codes = getattr(self, f"{column}_codes")
+            n_categories = len(getattr(self, f"{column}_names"))
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(n_categories + 1))
+            self._groups[column] = (order, bounds)
+        return self._groups[column]
+
+    def _code(self, column, name):
+        names = getattr(self, f"{column}_names")
+        matches = np.flatnonzero(names == name)
+        if len(matches) == 0:
+            raise KeyError(f"Unknown {column}: {name}")
+        return int(matches[0])
+
+    def group_indices(self, column, name):
+        """
+        Row indices of one label / speaker (a view of the precomputed sort order).
+        """
+        order, bounds = self._group(column)
+        code = self._code(column, name)
+        return order[bounds[code]:bounds[code + 1]]
+
+    def indices(self, label=None, speaker=None):
+        if label is None and speaker is None:
+            return np.arange(len(self))
+        if speaker is None:
+            return self.group_indices('label', label)
+        if label is None:
+            return self.group_indices('speaker', speaker)
+        rows = self.group_indices('speaker', speaker)
+        return rows[self.label_codes[rows] == self._code('label', label)]
+
+    def counts(self, column):
+        """
+        {name: count} per label / speaker.
+        """
+        names = getattr(self, f"{column}_names")
+        counts = np.bincount(getattr(self, f"{column}_codes"), minlength=len(names))
+        return dict(zip(names.tolist(), counts.tolist()))
+
+    def speakers_per_label(self):
+        """
+        {label: number of distinct speakers} in one pass (unique (label, speaker) code pairs).
+        """
+        pairs = np.unique(self.label_codes.astype(np.int64) * len(self.speaker_names) + self.speaker_codes)
+        per_label = np.bincount(pairs // max(1, len(self.speaker_names)), minlength=len(self.label_names))
+        return dict(zip(self.label_names.tolist(), per_label.tolist()))
+
+    def subset(self, rows):
+        rows = np.asarray(rows)
+        return Manifest(
+            self.paths[rows], self.label_codes[rows], self.label_names, self.speaker_codes[rows], self.speaker_names,
+            self.sizes[rows], self.sample_rates[rows], self.data_offsets[rows], self.data_sizes[rows], self.durations[rows]
+        )
+
+    def stratified_split(self, test_size=0.2, seed=42):
+        """
+        Random split preserving the class ratio. Returns: (train_rows, test_rows)
+        """
+        rng = np.random.default_rng(seed)
+        order, bounds = self._group('label')
+        test = []
+        for code in range(len(self.label_names)):
+            rows = rng.permutation(order[bounds[code]:bounds[code + 1]])
+            test.append(rows[:int(round(len(rows) * test_size))])
+        test = np.sort(np.concatenate(test)) if test else np.array([], dtype=np.int64)
+        train = np.setdiff1d(np.arange(len(self)), test, assume_unique=True)
+        return train, test
+
+    def speaker_split(self, test_size=0.2, seed=42):
+        """
+        Speaker-independent split: ~test_size of each class's speakers (at least one) go to test.
+        Returns: (train_rows, test_rows)
+        """
+        rng = np.random.default_rng(seed)
+        test_speakers = []
+        for code in range(len(self.label_names)):
+            speakers = np.unique(self.speaker_codes[self.label_codes == code])
+            if len(speakers) < 2:
+                continue
+            n_test = min(len(speakers) - 1, max(1, int(round(len(speakers) * test_size))))
+            test_speakers.append(rng.permutation(speakers)[:n_test])
+        test_mask = np.isin(self.speaker_codes, np.concatenate(test_speakers)) if test_speakers else np.zeros(len(self), bool)
+        return np.flatnonzero(~test_mask), np.flatnonzero(test_mask)
+
+    def dataset_stats(self, name, train_fraction=0.8):
+        """
+        Entry for outputs/dataset_stats.json (schema checked by tools/validate_json_outputs.py).
+        """
+        counts = self.counts('label')
+        speakers = self.speakers_per_label()
+        summary = []
+        for label in self.label_names.tolist():
+            total = counts[label]
+            summary.append({
+                "category": label.capitalize(),
+                "speakers": speakers[label],
+                "totalRaw": total,
+                "trainRaw": int(total * train_fraction),
+                "testRaw": total - int(total * train_fraction)
+            })
+        valid = self.durations[np.isfinite(self.durations)]
+        return {
+            "name": name,
+            "stats": {
+                "samples": f"{len(self):,}",
+                "classes": str(len(self.label_names)),
+                "avgLen": f"{valid.mean():.2f}s" if len(valid) else "N/A"
+            },
+            "summaryData": summary
+        }
@@ -0,0 +1,173 @@
+import collections
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from . import config
+
+
+def get_process_rss_bytes():
+    """
+    Resident set size of the current process (Linux /proc), None if unavailable.
+    """
+    try:
+        import resource
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * resource.getpagesize()
+    except (OSError, ImportError, ValueError, IndexError):
+        return None
+
+
+def estimate_model_bytes(model):
+    """
+    Memory held by a model's weights (float32 params + BN statistics, etc).
+    Accepts a Keras model or a wrapper exposing `.model`.
+    """
+    keras_model = getattr(model, 'model', model)
+    total = 0
+    for weight in getattr(keras_model, 'weights', []):
+        total += int(np.prod(weight.shape)) * weight.dtype.size
+    return total
+
+
+class ModelRegistry:
+    """
+    Thread-safe, bounded cache of loaded models.
+
+    - Concurrent `get()` calls for a model that is not resident yet are coalesced:
+      only the first caller runs `loader`, the others wait for its result.
+    - Resident models are capped by count (`max_models`) and/or weight bytes (`max_bytes`),
+      evicting the least recently used model first. 0 disables a limit.
+    """
+
+    def __init__(self, loader, max_models=config.MODEL_REGISTRY_MAX_MODELS, max_bytes=config.MODEL_REGISTRY_MAX_MB * 1024 * 1024,
+                 size_fn=estimate_model_bytes):
+        self.loader = loader
+        self.max_models = int(max_models)
+        self.max_bytes = int(max_bytes)
+        self.size_fn = size_fn
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # model_name -> (model, nbytes), LRU order
+        self._pending = {}  # model_name -> Future of an in-flight load
+
+        self.load_counts = collections.Counter()
+        self.evict_counts = collections.Counter()
+        self.hit_counts = collections.Counter()
+        self.load_ms = {}
+
+    def __contains__(self, model_name):
+        with self._lock:
+            return model_name in self._entries
+
+    def items(self):
+        with self._lock:
+            return [(name, entry[0]) for name, entry in self._entries.items()]
+
+    def peek(self, model_name):
+        """
+        The resident model or None, without loading it or touching the LRU order / hit counters.
+        """
+        with self._lock:
+            entry = self._entries.get(model_name)
+            return entry[0] if entry is not None else None
+
+    @property
+    def resident_bytes(self):
+        with self._lock:
+            return sum(nbytes for _, nbytes in self._entries.values())
+
+    def get(self, model_name):
+        """
+        Return the resident model, loading it (once, even under concurrency) if needed.
+        """
+        with self._lock:
+            if model_name in self._entries:
+                self._entries.move_to_end(model_name)
+                self.hit_counts[model_name] += 1
+                return self._entries[model_name][0]
+
+            pending = self._pending.get(model_name)
+            is_owner = pending is None
+            if is_owner:
+                pending = Future()
+                self._pending[model_name] = pending
+
+        if not is_owner:
+            # Another thread is already loading this model
+            return pending.result()
+
+        try:
+            t_start = time.perf_counter()
+            model = self.loader(model_name)
+            nbytes = self.size_fn(model)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[model_name]
+            pending.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[model_name] = (model, nbytes)
+            del self._pending[model_name]
+            self.load_counts[model_name] += 1
+            self.load_ms[model_name] = round((time.perf_counter() - t_start) * 1000, 1)
+            self._evict_locked(keep=model_name)
+
+        pending.set_result(model)
+        return model
+
+    def evict(self, model_name):
+        """
+        Drop a model explicitly (e.g. after new weights were deployed).
+        """
+        with self._lock:
+            if model_name in self._entries:
+                del self._entries[model_name]
+                self.evict_counts[model_name] += 1
+                return True
+            return False
+
+    def _evict_locked(self, keep):
+        def over_limit():
+            if self.max_models > 0 and len(self._entries) > self.max_models:
+                return True
+            if self.max_bytes > 0 and sum(nbytes for _, nbytes in self._entries.values()) > self.max_bytes:
+                return True
+            return False
+
+        while over_limit() and len(self._entries) > 1:
+            victim = next(name for name in self._entries if name != keep)
+            del self._entries[victim]
+            self.evict_counts[victim] += 1
+            print(f"♻️ Model registry: evict {victim} (LRU)")
+
+    def stats(self):
+        with self._lock:
+            names = set(self._entries) | set(self.load_counts) | set(self.evict_counts)
+            per_model = {
+                name: {
+                    "resident": name in self._entries,
+                    "bytes": self._entries[name][1] if name in self._entries else 0,
+                    "loads": self.load_counts[name],
+                    "evictions": self.evict_counts[name],
+                    "hits": self.hit_counts[name],
+                    "last_load_ms": self.load_ms.get(name)
+                }
+                for name in sorted(names)
+            }
+            resident_bytes = sum(nbytes for _, nbytes in self._entries.values())
+            loading = sorted(self._pending)
+
+        return {
+            "max_models": self.max_models,
+            "max_bytes": self.max_bytes,
+            "resident_models": sum(1 for m in per_model.values() if m["resident"]),
+            "resident_bytes": resident_bytes,
+            "process_rss_bytes": get_process_rss_bytes(),
+            "loading": loading,
+            "models": per_model
+        }
@@ -1,5 +1,6 @@
 import tensorflow as tf
 
+from . import config
 
 # Robust Keras Import for Windows/TF Environment
 try:
@@ -58,24 +59,30 @@ def create_lightweight_cnn(input_shape, num_classes=2):
     model = models.Model(inputs, outputs, name="Lightweight_CNN_STFT_Optimized")
     return model
 
-def create_transfer_learning_model(base_model_class, input_shape, num_classes=2, model_name='TL_Model'):
+def create_transfer_learning_model(base_model_class, input_shape, num_classes=2, model_name='TL_Model', broadcast_channels=True):
     """
     Generic wrapper for Transfer Learning models (MobileNet, EfficientNet, etc.).
-    Input: MFCC Image (H, W, 1) -> Converted to 3 Channels inside.
+    Input: MFCC Image (H, W, 1) -> Converted to 3 Channels inside the graph.
+    broadcast_channels=False builds the base model directly on the 1-channel input
+    (used by fold_channel_broadcast, the first conv then has a 1-channel kernel).
     """
+    # Keras applications only support a fully unknown spatial shape (their stride padding helper
+    # checks the height alone), so a variable time axis means (None, None, C) here
+    if None in tuple(input_shape[:2]):
+        input_shape = (None, None) + tuple(input_shape[2:])
+    
     # Input Layer
     inputs = layers.Input(shape=input_shape)
     
     # Convert 1-channel MFCC to 3-channel (Required by ImageNet weights)
-    # UPDATED LOGIC (Paper 2 Compliance):
-    # Stacking is now handled EXTERNALLY in data_loader.py (using tf.stack).
-    # So the input here is guaranteed to be (H, W, 3) for Transfer Learning.
-    x = inputs 
+    # Done INSIDE the graph: the input pipeline ships (H, W, 1), a third of the (H, W, 3) copy
+    # data_loader/app_api used to materialise. The broadcast layer has no weights, so .h5 files
+    # trained on 3-channel inputs still load topologically.
+    if input_shape[-1] == 1 and broadcast_channels:
+        x = layers.Concatenate(axis=-1, name='channel_broadcast')([inputs, inputs, inputs])
+    else:
+        x = inputs
     
-    # Base Model
-    # MobileNetV3/EfficientNet expect 3 channels. 
-    # Shapes will be inferred or resized by the model if strictly required, 
-    # but (40, 174, 3) is generally accepted by these flexible architectures (except some specific ones).
     # Base Model
     # MobileNetV3/EfficientNet expect 3 channels. 
     # Shapes will be inferred or resized by the model if strictly required, 
@@ -93,21 +100,134 @@ def create_transfer_learning_model(base_model_class, input_shape, num_classes=2,
     x = layers.Dropout(0.5)(x)
     outputs = layers.Dense(num_classes, activation='softmax')(x)
     
-    model = models.Model(inputs=base_model.input, outputs=outputs, name=model_name)
+    model = models.Model(inputs=inputs, outputs=outputs, name=model_name)
     return model
 
-def get_model(model_name, input_shape, num_classes=2):
+def get_model(model_name, input_shape, num_classes=2, broadcast_channels=True):
     """
     Dispatcher to create the requested model.
     """
     if model_name == 'cnn_stft':
         return create_lightweight_cnn(input_shape, num_classes)
     elif model_name == 'mobilenetv3':
-        return create_transfer_learning_model(keras.applications.MobileNetV3Small, input_shape, num_classes, 'MobileNetV3Small')
+        return create_transfer_learning_model(keras.applications.MobileNetV3Small, input_shape, num_classes, 'MobileNetV3Small', broadcast_channels)
     elif model_name == 'efficientnetb0':
-        return create_transfer_learning_model(keras.applications.EfficientNetB0, input_shape, num_classes, 'EfficientNetB0')
+        return create_transfer_learning_model(keras.applications.EfficientNetB0, input_shape, num_classes, 'EfficientNetB0', broadcast_channels)
     elif model_name == 'nasnetmobile':
-        return create_transfer_learning_model(keras.applications.NASNetMobile, input_shape, num_classes, 'NASNetMobile')
+        return create_transfer_learning_model(keras.applications.NASNetMobile, input_shape, num_classes, 'NASNetMobile', broadcast_channels)
     else:
         raise ValueError(f"Unknown model: {model_name}")
 
+
+# NASNet's cell shape adjustments need static spatial dims
+VARIABLE_LENGTH_MODELS = ('cnn_stft', 'mobilenetv3', 'efficientnetb0')
+
+def supports_variable_length(model_name):
+    """
+    True if the architecture accepts a None time dimension (bucketed training pipeline).
+    """
+    return model_name in VARIABLE_LENGTH_MODELS
+
+def get_serving_input_shape(model_name, variable_length=False):
+    """
+    Serving input shape (without batch dim) for each architecture.
+    - cnn_stft: Mel Spectrogram (Time, Mel, 1) -> (174, 27, 1)
+    - Transfer Learning: 1-channel MFCC (MFCC, Time, 1) -> (40, 174, 1), broadcast to 3 channels in-graph
+    variable_length=True: time axis None (models trained with the bucketed pipeline).
+    """
+    time_steps = None if variable_length and supports_variable_length(model_name) else config.MFCC_MAX_LEN
+    if model_name == 'cnn_stft':
+        return (time_steps, 27, 1)
+    return (config.N_MFCC, time_steps, 1)
+
+# Layers that act on every channel identically, so they commute with the 1 -> 3 channel broadcast
+_CHANNEL_AGNOSTIC_LAYERS = (layers.InputLayer, layers.Concatenate, layers.Rescaling)
+
+def fold_channel_broadcast(model, model_name):
+    """
+    Load-time optimisation for Transfer Learning models built with the 'channel_broadcast' layer:
+    conv(concat[x, x, x], W) == conv(x, sum_c W[:, :, c, :]), so the broadcast is folded into the
+    first convolution's kernel and the model runs on the 1-channel input directly.
+    Only applied when nothing between the input and that conv treats channels differently
+    (MobileNetV3, NASNetMobile). EfficientNet normalises per RGB channel before its stem
+    (and zero-pads after it), so it keeps the in-graph broadcast.
+    Returns: the folded model, or `model` unchanged when folding does not apply.
+    """
+    try:
+        model.get_layer('channel_broadcast')
+    except ValueError:
+        return model
+
+    weighted = [layer for layer in model.layers if layer.weights]
+    first = weighted[0] if weighted else None
+    if not isinstance(first, layers.Conv2D) or isinstance(first, layers.DepthwiseConv2D):
+        return model
+    for layer in model.layers[:model.layers.index(first)]:
+        if not isinstance(layer, _CHANNEL_AGNOSTIC_LAYERS):
+            return model
+
+    folded = get_model(model_name, tuple(model.input_shape[1:]), num_classes=model.output_shape[-1], broadcast_channels=False)
+    folded_weighted = [layer for layer in folded.layers if layer.weights]
+    if len(folded_weighted) != len(weighted):
+        return model
+
+    for i, (source, target) in enumerate(zip(weighted, folded_weighted)):
+        values = source.get_weights()
+        if i == 0:
+            # Kernel (kh, kw, 3, out) -> (kh, kw, 1, out)
+            values[0] = values[0].sum(axis=2, keepdims=True)
+        target.set_weights(values)
+    return folded
+
+def wrap_channel_broadcast(model):
+    """
+    Puts a 1 -> C channel broadcast in front of a full model saved with a C-channel input
+    (legacy .h5 loaded via load_model), so it accepts the 1-channel serving features.
+    """
+    channels = model.input_shape[-1]
+    inputs = layers.Input(shape=tuple(model.input_shape[1:-1]) + (1,))
+    x = layers.Concatenate(axis=-1, name='channel_broadcast')([inputs] * channels)
+    return models.Model(inputs, model(x), name=model.name)
+
+class CompiledInference:
+    """
+    Inference function with a fixed input_signature (None, H, W, C).
+    Traced ONCE at construction and reused for every batch size, so requests skip
+    the data adapter / step loop that `model.predict` rebuilds on every call.
+    `weights_version` identifies the loaded weights (mtime of the weights file) for result caching.
+    """
+    def __init__(self, model, input_shape, weights_version=0):
+        self.model = model
+        self.input_shape = tuple(input_shape)
+        self.weights_version = weights_version
+        self.input_signature = [tf.TensorSpec(shape=(None,) + self.input_shape, dtype=tf.float32)]
+        self.call_count = 0
+        self._fn = tf.function(self._forward, input_signature=self.input_signature)
+        # Trace now (load time), not on the first request
+        self._fn.get_concrete_function()
+
+    def _forward(self, inputs):
+        return self.model(inputs, training=False)
+
+    @property
+    def trace_count(self):
+        return self._fn.experimental_get_tracing_count()
+
+    @property
+    def retrace_count(self):
+        # Anything beyond the initial load-time trace is a retrace
+        return max(0, self.trace_count - 1)
+
+    def __call__(self, inputs):
+        self.call_count += 1
+        outputs = self._fn(tf.convert_to_tensor(inputs, dtype=tf.float32))
+        return outputs.numpy()
+
+    def stats(self):
+        return {
+            "input_signature": [None] + list(self.input_shape),
+            "trace_count": self.trace_count,
+            "retrace_count": self.retrace_count,
+            "call_count": self.call_count,
+            "weights_version": self.weights_version
+        }
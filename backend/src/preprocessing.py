@@ -1,120 +1,508 @@
+import fractions
+import functools
+import math
+
 import tensorflow as tf
 import numpy as np
 
 from . import config
 
+# Upload sample rates whose polyphase filters are precomputed (-> config.SAMPLE_RATE)
+COMMON_SAMPLE_RATES = (8000, 22050, 44100, 48000)
+# Largest up/down factor a polyphase filter is designed for (11.025k -> 16k needs 640/441). Other rate pairs
+# get their ratio rounded to the closest fraction within this bound (rate error < 0.05% for 4k-384k inputs),
+# so no odd rate can make the filter (10 * max(up, down) taps per side) or the per-branch loop arbitrarily large.
+RESAMPLE_MAX_FACTOR = 1024
+
+# Mel bins of the CNN-STFT front-end (Paper 2 spec)
+STFT_MEL_BINS = 27
+
+class FeatureExtractor:
+    """
+    STFT / Mel / MFCC front-end with its constants built ONCE per configuration:
+    Hann window, 27-bin (CNN-STFT) and N_MFCC-bin (MFCC) mel matrices, DCT-II basis.
+    Shared by training (create_tf_dataset) and serving (/predict); get via get_feature_extractor().
+    """
+    def __init__(self, sample_rate, frame_length, frame_step, fft_length, target_len, stft_mel_bins, n_mfcc):
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.frame_step = frame_step
+        self.fft_length = fft_length
+        self.target_len = target_len
+        self.n_mfcc = n_mfcc
+        num_spectrogram_bins = fft_length // 2 + 1
+
+        # init_scope: constants are built eagerly even when the first call happens while
+        # tracing (dataset.map / tf.function), so the cached instance is reusable by every graph
+        with tf.init_scope():
+            # Same window tf.signal.stft would build on every call (periodic Hann)
+            self.window = tf.signal.hann_window(frame_length, periodic=True)
+
+            self.stft_mel_matrix = tf.signal.linear_to_mel_weight_matrix(
+                num_mel_bins=stft_mel_bins,
+                num_spectrogram_bins=num_spectrogram_bins,
+                sample_rate=sample_rate,
+                lower_edge_hertz=20.0,
+                upper_edge_hertz=sample_rate / 2.0
+            )
+            self.mfcc_mel_matrix = tf.signal.linear_to_mel_weight_matrix(
+                num_mel_bins=n_mfcc,
+                num_spectrogram_bins=num_spectrogram_bins,
+                sample_rate=sample_rate,
+                lower_edge_hertz=20.0,
+                upper_edge_hertz=sample_rate / 2.0 # Nyquist Frequency
+            )
+
+            # DCT-II basis equal to tf.signal.mfccs_from_log_mel_spectrograms:
+            # mfcc_k = dct2(x)_k / sqrt(2N), dct2(x)_k = 2 * sum_n x_n cos(pi * k * (2n + 1) / 2N)
+            n = np.arange(n_mfcc)[:, None]
+            k = np.arange(n_mfcc)[None, :]
+            dct_basis = 2.0 * np.cos(np.pi * k * (2 * n + 1) / (2.0 * n_mfcc)) / np.sqrt(2.0 * n_mfcc)
+            self.dct_matrix = tf.constant(dct_basis[:, :n_mfcc], dtype=tf.float32)
+
+    def _window_fn(self, frame_length, dtype=tf.float32):
+        return tf.cast(self.window, dtype)
+
+    def pad_or_trim(self, audio, lengths=None):
+        """
+        (B, T) padded batch -> (B, target_len) without Python branching.
+        Samples beyond each row's length are zeroed, exactly like per-clip zero padding (~5.6s).
+        """
+        target_len = self.target_len
+        audio = tf.cast(audio, tf.float32)[:, :target_len]
+        audio = tf.pad(audio, [[0, 0], [0, target_len - tf.shape(audio)[1]]])
+        audio.set_shape([None, target_len])
+        return self.mask(audio, lengths)
+
+    def mask(self, audio, lengths=None):
+        """
+        Zeroes samples beyond each row's true length (keeps the batch's own width).
+        """
+        audio = tf.cast(audio, tf.float32)
+        if lengths is not None:
+            width = tf.shape(audio)[1]
+            mask = tf.sequence_mask(tf.minimum(lengths, width), width, dtype=tf.float32)
+            audio = audio * mask
+        return audio
+
+    def frame_count(self, num_samples):
+        """
+        STFT frames for `num_samples` (no end padding): 174 for the full ~5.6s window.
+        """
+        return 1 + (num_samples - self.frame_length) // self.frame_step
+
+    def bucket_lengths(self, frames):
+        """
+        Sample lengths whose STFT yields exactly `frames` frames each (bucket boundaries of the
+        variable-length pipeline).
+        """
+        return [(f - 1) * self.frame_step + self.frame_length for f in frames]
+
+    def magnitude(self, audio):
+        stft = tf.signal.stft(
+            audio, 
+            frame_length=self.frame_length, 
+            frame_step=self.frame_step,
+            fft_length=self.fft_length,
+            window_fn=self._window_fn
+        )
+        return tf.abs(stft)
+
+    def spectrogram_batch(self, audio, lengths=None, variable_length=False):
+        """
+        Computes Mel Spectrograms for a padded batch in ONE tf.signal.stft call (Paper 2: 27 Mel Bins).
+        Input: (B, T) + optional lengths (B,). Output Shape: (B, Time, Freq, 1) -> (B, 174, 27, 1)
+        variable_length=True keeps the batch's own width T (bucketed pipeline): only frame_count(T)
+        frames are computed. Mean and peak are the fixed window's (padding to target_len included),
+        so they equal the first frames of the fixed-length spectrogram up to float rounding.
+        """
+        # 1. Padding/Trimming
+        if variable_length:
+            audio = self.mask(audio[:, :self.target_len], lengths)
+            # Same statistic as the fixed window: mean over target_len samples (padding counts as zeros)
+            mean = tf.math.reduce_sum(audio, axis=-1, keepdims=True) / float(self.target_len)
+        else:
+            audio = self.pad_or_trim(audio, lengths)
+            mean = tf.math.reduce_mean(audio, axis=-1, keepdims=True)
+
+        # 2. Normalization (per clip)
+        audio = audio - mean
+        peak = tf.math.reduce_max(tf.math.abs(audio), axis=-1, keepdims=True)
+        if variable_length:
+            # Same peak as the fixed window: its zero padding up to target_len becomes -mean after centering,
+            # and counts even when this bucket has no padding left (clip exactly as long as the bucket)
+            width = tf.shape(audio)[1]
+            clip_len = width if lengths is None else tf.minimum(lengths, width)
+            padded = tf.cast(clip_len < self.target_len, tf.float32) * tf.ones_like(mean[:, 0])
+            peak = tf.maximum(peak, tf.math.abs(mean) * padded[:, None])
+        audio = audio / (peak + 1e-6)
+        
+        # 3. STFT -> (B, Time, Bins)
+        spectrogram = self.magnitude(audio)
+        
+        # 4. Convert to Mel Scale (Paper 2: 27 Mel Bins)
+        mel_spectrogram = tf.tensordot(spectrogram, self.stft_mel_matrix, 1)
+        mel_spectrogram.set_shape(spectrogram.shape[:-1].concatenate(self.stft_mel_matrix.shape[-1:]))
+        
+        # 5. Log Scale
+        mel_spectrogram = tf.math.log(mel_spectrogram + 1e-6)
+        
+        # 6. Add Channel Dimension -> (B, Time, Freq, 1)
+        return tf.expand_dims(mel_spectrogram, -1)
+
+    def mfcc_batch(self, audio, lengths=None, variable_length=False):
+        """
+        Computes MFCCs for a padded batch in ONE tf.signal.stft call (Paper 2: 40 MFCCs).
+        Input: (B, T) + optional lengths (B,). Output Shape: (B, N_MFCC, Time, 1) -> (B, 40, 174, 1)
+        variable_length=True keeps the batch's own width T (bucketed pipeline): (B, 40, frame_count(T), 1).
+        """
+        # 1. Pad/Trim to approx 5.6s
+        if variable_length:
+            audio = self.mask(audio[:, :self.target_len], lengths)
+        else:
+            audio = self.pad_or_trim(audio, lengths)
+        
+        # 2. STFT -> (B, Time, Bins)
+        spectrogram = self.magnitude(audio)
+        
+        # 3. Mel
+        mel_spectrograms = tf.tensordot(spectrogram, self.mfcc_mel_matrix, 1)
+        mel_spectrograms.set_shape(spectrogram.shape[:-1].concatenate(self.mfcc_mel_matrix.shape[-1:]))
+        log_mel = tf.math.log(mel_spectrograms + 1e-6)
+        
+        # 4. MFCC (precomputed DCT-II basis) -> (B, Time, MFCC)
+        mfccs = tf.tensordot(log_mel, self.dct_matrix, 1)
+        
+        # 5. Transpose to (B, MFCC, Time) to match ImageNet style (Height, Width)
+        mfccs = tf.transpose(mfccs, perm=[0, 2, 1])
+        
+        # 6. Add Channel Dimension -> (B, MFCC, Time, 1)
+        return tf.expand_dims(mfccs, -1)
+
+    def features_batch(self, audio, lengths=None, feature_type='stft', variable_length=False):
+        if feature_type == 'mfcc':
+            return self.mfcc_batch(audio, lengths, variable_length)
+        return self.spectrogram_batch(audio, lengths, variable_length)
+
+    def features_multi(self, audio, lengths=None, feature_types=('stft', 'mfcc')):
+        """
+        Several feature views of ONE decoded/padded batch: {feature_type: (B, H, W, 1)}.
+        Padding & masking run once; each view keeps its own STFT (CNN-STFT normalises the clip first).
+        """
+        audio = self.pad_or_trim(audio, lengths)
+        return {feature_type: self.features_batch(audio, None, feature_type) for feature_type in feature_types}
+
+    def spectrogram(self, audio):
+        """
+        Single clip (T,) -> (174, 27, 1). Same graph as the batch version with B=1.
+        """
+        return self.spectrogram_batch(tf.expand_dims(audio, 0))[0]
+
+    def mfcc(self, audio):
+        """
+        Single clip (T,) -> (40, 174, 1). Same graph as the batch version with B=1.
+        """
+        return self.mfcc_batch(tf.expand_dims(audio, 0))[0]
+
+@functools.lru_cache(maxsize=8)
+def _cached_feature_extractor(sample_rate, frame_length, frame_step, fft_length, target_len, stft_mel_bins, n_mfcc):
+    return FeatureExtractor(sample_rate, frame_length, frame_step, fft_length, target_len, stft_mel_bins, n_mfcc)
+
+def get_feature_extractor():
+    """
+    Returns the FeatureExtractor for the CURRENT config values (cached per configuration,
+    so overriding config in a notebook yields a fresh one automatically).
+    """
+    return _cached_feature_extractor(
+        config.SAMPLE_RATE, config.STFT_WINDOW_SIZE, config.STFT_STRIDE, config.N_FFT,
+        config.AUDIO_MAX_LENGTH, STFT_MEL_BINS, config.N_MFCC
+    )
+
 def get_spectrogram(audio):
     """
     Computes Mel Spectrogram (Paper 2 Spec: 27 Mel Bins, No Pooling).
     Output Shape: (Time, Freq, 1) -> (174, 27, 1)
     """
-    # 1. Padding/Trimming to match Paper 2 duration (~5.6s)
-    target_len = config.AUDIO_MAX_LENGTH
-    input_len = tf.shape(audio)[0]
-    
-    if input_len > target_len:
-        audio = audio[:target_len]
-    else:
-        padding = target_len - input_len
-        audio = tf.pad(audio, [[0, padding]])
-
-    # 2. Normalization
-    audio = tf.cast(audio, tf.float32)
-    audio = audio - tf.math.reduce_mean(audio)
-    audio = audio / (tf.math.reduce_max(tf.math.abs(audio)) + 1e-6)
-    
-    # 3. STFT
-    stft = tf.signal.stft(
-        audio, 
-        frame_length=config.STFT_WINDOW_SIZE, 
-        frame_step=config.STFT_STRIDE,
-        fft_length=config.N_FFT
-    )
-    spectrogram = tf.abs(stft)
-    
-    # 4. Convert to Mel Scale (Paper 2: 27 Mel Bins)
-    num_spectrogram_bins = stft.shape[-1]
-    linear_to_mel_weight_matrix = tf.signal.linear_to_mel_weight_matrix(
-        num_mel_bins=27,  # Paper 2 spec
-        num_spectrogram_bins=num_spectrogram_bins,
-        sample_rate=config.SAMPLE_RATE,
-        lower_edge_hertz=20.0,
-        upper_edge_hertz=config.SAMPLE_RATE / 2.0
-    )
-    mel_spectrogram = tf.tensordot(spectrogram, linear_to_mel_weight_matrix, 1)
-    mel_spectrogram.set_shape(spectrogram.shape[:-1].concatenate(linear_to_mel_weight_matrix.shape[-1:]))
-    
-    # 5. Log Scale
-    mel_spectrogram = tf.math.log(mel_spectrogram + 1e-6)
-    
-    # 6. Add Channel Dimension -> (Time, Freq, 1)
-    mel_spectrogram = tf.expand_dims(mel_spectrogram, -1)
-    
-    return mel_spectrogram
+    return get_feature_extractor().spectrogram(audio)
 
 def get_mfcc(audio):
     """
     Computes MFCCs using TensorFlow. Matches Paper 2 (40 MFCCs).
     Output Shape: (N_MFCC, Time, 1) -> (40, 174, 1)
     """
-    # 1. Pad/Trim to approx 5.6s
-    target_len = config.AUDIO_MAX_LENGTH
-    
-    # Get current length
-    audio_len = tf.shape(audio)[0]
-    
-    if audio_len > target_len:
-        audio = audio[:target_len]
-    else:
-        padding = target_len - audio_len
-        audio = tf.pad(audio, [[0, padding]])
-        
-    audio = tf.cast(audio, tf.float32)
-    
-    # 2. STFT
-    stft = tf.signal.stft(
-        audio, 
-        frame_length=config.STFT_WINDOW_SIZE, 
-        frame_step=config.STFT_STRIDE,
-        fft_length=config.N_FFT
-    )
-    spectrogram = tf.abs(stft)
-    
-    # 3. Mel
-    num_spectrogram_bins = stft.shape[-1]
-    linear_to_mel_weight_matrix = tf.signal.linear_to_mel_weight_matrix(
-        num_mel_bins=config.N_MFCC,
-        num_spectrogram_bins=num_spectrogram_bins,
-        sample_rate=config.SAMPLE_RATE,
-        lower_edge_hertz=20.0,
-        upper_edge_hertz=config.SAMPLE_RATE / 2.0 # Nyquist Frequency
-    )
-    mel_spectrograms = tf.tensordot(spectrogram, linear_to_mel_weight_matrix, 1)
-    mel_spectrograms.set_shape(spectrogram.shape[:-1].concatenate(linear_to_mel_weight_matrix.shape[-1:]))
-    log_mel = tf.math.log(mel_spectrograms + 1e-6)
-    
-    # 4. MFCC
-    # tf.signal.mfccs_from_log_mel_spectrograms returns (..., Time, MFCC)
-    mfccs = tf.signal.mfccs_from_log_mel_spectrograms(log_mel)
-    mfccs = mfccs[..., :config.N_MFCC]
-    
-    # 5. Transpose to (MFCC, Time) to match ImageNet style (Height, Width)
-    # Current: (Time, MFCC)
-    # Target: (MFCC, Time)
-    mfccs = tf.transpose(mfccs, perm=[1, 0])
-    
-    # 6. Add Channel Dimension -> (MFCC, Time, 1)
-    mfccs = tf.expand_dims(mfccs, -1)
-    
-    return mfccs
+    return get_feature_extractor().mfcc(audio)
 
-def load_and_preprocess_wav(file_path, feature_type='stft'):
+def resample_factors(orig_sr, target_sr, max_factor=RESAMPLE_MAX_FACTOR):
     """
-    Loads wav and extracts features (STFT or MFCC).
+    (up, down) for orig_sr -> target_sr: the exact reduced ratio when both fit in `max_factor`,
+    otherwise the closest fraction whose up and down both do.
+    """
+    g = math.gcd(int(orig_sr), int(target_sr))
+    up, down = int(target_sr) // g, int(orig_sr) // g
+    if max(up, down) <= max_factor:
+        return up, down
+    ratio = fractions.Fraction(up, down)
+    # limit_denominator bounds `down`; when upsampling, up ~ ratio * down must stay in bounds too
+    approx = ratio.limit_denominator(max(1, int(max_factor / max(1.0, float(ratio)))))
+    return approx.numerator, approx.denominator
+
+def get_polyphase_filter(orig_sr, target_sr):
+    """
+    Anti-aliasing FIR for rational resampling up/down (see resample_factors), split into `up` polyphase branches.
+    Kaiser-windowed sinc, cutoff at the lower Nyquist, half length 10 * max(up, down) (scipy resample_poly defaults).
+    Cached per (up, down), so the cache holds at most a few bounded-size filters whatever rates come in.
+    Returns: (up, down, half_len, phases, first_output)
+        phases: (up, taps_per_phase), time-reversed so each branch is a plain dot product with the input window
+        first_output: (up,) first output index served by each branch
+    """
+    return _design_polyphase_filter(*resample_factors(orig_sr, target_sr))
+
+@functools.lru_cache(maxsize=32)
+def _design_polyphase_filter(up, down):
+    max_rate = max(up, down)
+    cutoff = 1.0 / max_rate
+    half_len = 10 * max_rate
+
+    n = np.arange(-half_len, half_len + 1)
+    taps = np.sinc(cutoff * n) * np.kaiser(2 * half_len + 1, 5.0)
+    taps = taps / taps.sum() * up  # unity DC gain after zero-stuffing by `up`
+
+    # branch p holds taps[p + j * up], j = 0..taps_per_phase-1
+    taps_per_phase = -(-len(taps) // up)
+    padded = np.zeros(taps_per_phase * up)
+    padded[:len(taps)] = taps
+    phases = padded.reshape(taps_per_phase, up).T[:, ::-1].astype(np.float32)
+
+    # Output n uses branch (n * down + half_len) % up; down is invertible mod up (coprime)
+    inverse_down = pow(down, -1, up) if up > 1 else 0
+    first_output = np.array([((p - half_len) * inverse_down) % up for p in range(up)], dtype=np.int64)
+    return up, down, half_len, np.ascontiguousarray(phases), first_output
+
+def precompute_resample_filters(rates=COMMON_SAMPLE_RATES, target_sr=config.SAMPLE_RATE):
+    """
+    Fills the polyphase filter cache for the usual upload rates (8k, 22.05k, 44.1k, 48k -> 16k).
+    """
+    for rate in rates:
+        if rate != target_sr:
+            get_polyphase_filter(rate, target_sr)
+
+def resample_poly(audio, orig_sr, target_sr=config.SAMPLE_RATE, block_size=8192):
+    """
+    Polyphase resampling orig_sr -> target_sr (NumPy, vectorised over a leading batch axis).
+    Rate pairs beyond RESAMPLE_MAX_FACTOR use the rounded ratio of resample_factors.
+    Outputs of one branch read the input at a fixed stride (`down`), so each branch is a single
+    matrix-vector product over a strided (zero-copy) window view; no zero-stuffed signal is built.
+    Work is split in blocks of `block_size` outputs per branch to bound memory on long clips.
+    Input: (T,) or (B, T). Output: (..., ceil(T * up / down)) float32 (= ceil(T * target_sr / orig_sr) for exact ratios)
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if int(orig_sr) == int(target_sr):
+        return audio
+
+    up, down, half_len, phases, first_output = get_polyphase_filter(int(orig_sr), int(target_sr))
+    taps_per_phase = phases.shape[1]
+    length = audio.shape[-1]
+    out_len = -(-length * up // down)
+
+    # Zero padding on both sides so every window is in range
+    pad_width = [(0, 0)] * (audio.ndim - 1) + [(taps_per_phase, half_len // up + 2)]
+    padded = np.ascontiguousarray(np.pad(audio, pad_width))
+    item = padded.strides[-1]
+
+    output = np.empty(audio.shape[:-1] + (out_len,), dtype=np.float32)
+    for p in range(up):
+        n0 = int(first_output[p])
+        if n0 >= out_len:
+            continue
+        count = -(-(out_len - n0) // up)
+        # Newest input sample of output n0; its window ends there (padded coords: +taps_per_phase)
+        window_end = (n0 * down + half_len) // up + taps_per_phase
+        for k0 in range(0, count, block_size):
+            k_count = min(block_size, count - k0)
+            start = window_end - taps_per_phase + 1 + k0 * down
+            windows = np.lib.stride_tricks.as_strided(
+                padded[..., start:],
+                shape=padded.shape[:-1] + (k_count, taps_per_phase),
+                strides=padded.strides[:-1] + (down * item, item),
+                writeable=False
+            )
+            output[..., n0 + k0 * up: n0 + (k0 + k_count) * up: up] = windows @ phases[p]
+    return output
+
+class StreamingResampler:
+    """
+    Chunk-by-chunk resample_poly for streamed uploads: the concatenated output equals
+    resample_poly() of the whole signal, while only the filter history (a few hundred input
+    samples) is kept between chunks.
+    Each chunk is resampled together with that history, starting at an input index that is a
+    multiple of `down` (so local and global output positions line up), and only the outputs
+    whose filter window is complete are emitted; the rest come with the next chunk or flush().
+    """
+    def __init__(self, orig_sr, target_sr=config.SAMPLE_RATE):
+        self.orig_sr, self.target_sr = int(orig_sr), int(target_sr)
+        self.up, self.down, self.half_len, phases, _ = get_polyphase_filter(self.orig_sr, self.target_sr)
+        self.taps_per_phase = phases.shape[1]
+        self._buffer = np.zeros((0,), dtype=np.float32)
+        self._buffer_start = 0  # global input index of _buffer[0] (multiple of down)
+        self._emitted = 0       # global output samples emitted so far
+
+    def _emit(self, out_end):
+        local_start = self._buffer_start // self.down * self.up
+        out = resample_poly(self._buffer, self.orig_sr, self.target_sr)[self._emitted - local_start:out_end - local_start]
+        self._emitted = max(self._emitted, out_end)
+        return out
+
+    def process(self, chunk):
+        self._buffer = np.concatenate([self._buffer, np.asarray(chunk, dtype=np.float32)])
+        available = self._buffer_start + len(self._buffer)
+        # Output n needs input up to (n * down + half_len) // up: complete for n < out_end
+        out_end = max(0, -(-(available * self.up - self.half_len) // self.down))
+        if out_end <= self._emitted:
+            return np.zeros((0,), dtype=np.float32)
+        out = self._emit(out_end)
+
+        # Keep the history of the next output's window (oldest input it reads), aligned down to `down`
+        oldest = (self._emitted * self.down + self.half_len) // self.up - self.taps_per_phase + 1
+        new_start = max(self._buffer_start, oldest // self.down * self.down)
+        self._buffer = self._buffer[new_start - self._buffer_start:]
+        self._buffer_start = new_start
+        return out
+
+    def flush(self):
+        available = self._buffer_start + len(self._buffer)
+        return self._emit(-(-available * self.up // self.down))
+
+def get_features_batch(audio, lengths=None, feature_type='stft', variable_length=False):
+    """
+    Batch-native STFT-Mel / MFCC for a (B, T) zero-padded batch plus true lengths (B,).
+    Output: (B, 174, 27, 1) for 'stft' or (B, 40, 174, 1) for 'mfcc'.
+    variable_length=True: the time axis follows the batch width instead (bucketed training).
+    Used after `padded_batch` in create_tf_dataset and by the serving micro-batcher.
+    """
+    return get_feature_extractor().features_batch(audio, lengths, feature_type, variable_length)
+
+def get_features_multi(audio, lengths=None, feature_types=('stft', 'mfcc')):
+    """
+    STFT-Mel and MFCC (or any subset) from the same (B, T) batch: {feature_type: features}.
+    Lets one decode feed every model family (see feature_cache.materialize_features).
+    """
+    return get_feature_extractor().features_multi(audio, lengths, feature_types)
+
+def stack_waveforms(waveforms, target_len=None):
+    """
+    Collates variable-length 1-D waveforms into a zero-padded (B, target_len) float32 array + lengths (B,).
+    Clips longer than target_len (default: config.AUDIO_MAX_LENGTH) are trimmed.
+    """
+    target_len = target_len or config.AUDIO_MAX_LENGTH
+    batch = np.zeros((len(waveforms), target_len), dtype=np.float32)
+    lengths = np.zeros((len(waveforms),), dtype=np.int32)
+    for i, waveform in enumerate(waveforms):
+        n = min(len(waveform), target_len)
+        batch[i, :n] = waveform[:n]
+        lengths[i] = n
+    return batch, lengths
+
+def vad_params(sample_rate=config.SAMPLE_RATE):
+    """
+    VAD settings in samples: {frame_length, frame_step, margin, threshold_db}.
+    """
+    return {
+        "frame_length": int(sample_rate * config.VAD_FRAME_MS / 1000),
+        "frame_step": int(sample_rate * config.VAD_HOP_MS / 1000),
+        "margin": int(sample_rate * config.VAD_MARGIN_MS / 1000),
+        "threshold_db": float(config.VAD_THRESHOLD_DB)
+    }
+
+def trim_silence(audio, sample_rate=config.SAMPLE_RATE):
+    """
+    Energy VAD: cuts leading / trailing frames more than config.VAD_THRESHOLD_DB below the
+    loudest frame of the clip, keeping config.VAD_MARGIN_MS of context around the speech.
+    One framing + reduction over the whole clip (no Python loop), usable eagerly and inside tf.data.
+    A clip without any louder frame (e.g. digital silence) is returned unchanged.
+    Returns: (trimmed waveform (T',), samples removed at the start, samples removed at the end)
+    """
+    params = vad_params(sample_rate)
+    audio = tf.convert_to_tensor(audio, dtype=tf.float32)
+    num_samples = tf.shape(audio)[0]
+
+    frames = tf.signal.frame(audio, params["frame_length"], params["frame_step"], pad_end=True)
+    energy_db = 10.0 * tf.math.log(tf.reduce_mean(tf.square(frames), axis=-1) + 1e-10) / math.log(10.0)
+    active = energy_db >= tf.reduce_max(energy_db) + params["threshold_db"]
+
+    # First / last active frame (an empty clip gives first > last -> nothing kept beyond its 0 samples)
+    frame_ids = tf.range(tf.shape(energy_db)[0])
+    first = tf.reduce_min(tf.where(active, frame_ids, tf.shape(energy_db)[0]))
+    last = tf.reduce_max(tf.where(active, frame_ids, -1))
+
+    start = tf.maximum(first * params["frame_step"] - params["margin"], 0)
+    end = tf.minimum(last * params["frame_step"] + params["frame_length"] + params["margin"], num_samples)
+    end = tf.maximum(end, start)
+    return audio[start:end], start, num_samples - end
+
+def vad_report(num_samples, removed_start, removed_end, sample_rate=config.SAMPLE_RATE):
+    """
+    Summary of one trim_silence() call: samples / ms / VAD frames removed and the STFT frames saved.
+    """
+    removed_start, removed_end = int(removed_start), int(removed_end)
+    removed = removed_start + removed_end
+    kept = int(num_samples) - removed
+    extractor = get_feature_extractor()
+    max_frames = extractor.frame_count(config.AUDIO_MAX_LENGTH)
+    return {
+        "removed_start_ms": 1000.0 * removed_start / sample_rate,
+        "removed_end_ms": 1000.0 * removed_end / sample_rate,
+        "samples_removed": removed,
+        "frames_removed": removed // vad_params(sample_rate)["frame_step"],
+        "stft_frames_saved": (min(max(extractor.frame_count(int(num_samples)), 0), max_frames)
+                              - min(max(extractor.frame_count(kept), 0), max_frames))
+    }
+
+def frame_windows(waveform, window=None, hop=None):
+    """
+    Overlapping analysis windows over a long 1-D waveform for sliding-window inference.
+    window: samples per window (default config.AUDIO_MAX_LENGTH), hop: samples between window starts
+    (default config.WINDOW_HOP_SECONDS). The last window is zero-padded; a clip shorter than one
+    window gives a single window.
+    Returns: (windows float32 (N, window), lengths int32 (N,), starts int64 (N,)), ready for get_features_batch
+    """
+    window = window or config.AUDIO_MAX_LENGTH
+    hop = hop or int(config.WINDOW_HOP_SECONDS * config.SAMPLE_RATE)
+    waveform = np.asarray(waveform, dtype=np.float32)
+
+    num_windows = 1 + max(0, math.ceil((len(waveform) - window) / hop))
+    padded = np.zeros(((num_windows - 1) * hop + window,), dtype=np.float32)
+    padded[:len(waveform)] = waveform
+
+    # Strided view (no copy) -> one contiguous (N, window) batch
+    windows = np.ascontiguousarray(np.lib.stride_tricks.sliding_window_view(padded, window)[::hop])
+    starts = np.arange(num_windows, dtype=np.int64) * hop
+    lengths = np.clip(len(waveform) - starts, 0, window).astype(np.int32)
+    return windows, lengths, starts
+
+def load_wav(file_path, max_len=None, vad=None):
+    """
+    Reads + decodes a wav file to a mono float32 waveform (T,), trimmed to `max_len` samples if given.
+    """
+    return decode_wav_bytes(tf.io.read_file(file_path), max_len, vad)
+
+def decode_wav_bytes(file_contents, max_len=None, vad=None):
+    """
+    WAV bytes (scalar string tensor, e.g. from a TFRecord shard) -> mono float32 waveform (T,).
+    vad (default config.VAD_ENABLED): trim silence BEFORE cutting to `max_len`, so the window starts at the speech.
     """
-    file_contents = tf.io.read_file(file_path)
     audio, sample_rate = tf.audio.decode_wav(file_contents, desired_channels=1)
     audio = tf.squeeze(audio, axis=-1)
+    if config.VAD_ENABLED if vad is None else vad:
+        audio, _, _ = trim_silence(audio)
+    if max_len is not None:
+        audio = audio[:max_len]
+    return audio
+
+def load_and_preprocess_wav(file_path, feature_type='stft'):
+    """
+    Loads wav and extracts features (STFT or MFCC).
+    """
+    audio = load_wav(file_path)
     
     if feature_type == 'stft':
         return get_spectrogram(audio)
@@ -0,0 +1,122 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from . import config
+
+
+def weights_version(weights_path):
+    """
+    Version of a weights file for cache keys: its mtime in ns (0 if missing, i.e. random weights).
+    """
+    try:
+        return os.stat(weights_path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class ResultCache:
+    """
+    Thread-safe in-memory cache of prediction results (LRU, optionally with a TTL).
+
+    Keys are (content hash of the decoded PCM, model name, weights version), so the same audio
+    uploaded again (any file name / container) skips featurisation and inference, and results
+    from older weights can never be returned once the model is reloaded with new ones.
+    Values are stored as read-only NumPy arrays and returned as-is (no copy).
+    """
+
+    def __init__(self, max_entries=config.RESULT_CACHE_SIZE, ttl_seconds=config.RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key -> (value, stored_at), LRU order
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def digest(waveform):
+        """
+        Content hash of a decoded waveform (float32 PCM at config.SAMPLE_RATE).
+        """
+        return hashlib.blake2b(np.ascontiguousarray(waveform, dtype=np.float32).data, digest_size=16).hexdigest()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        """
+        Cached value for `key`, or None (counted as a miss; expired entries are dropped).
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds > 0 and time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        value = np.array(value, copy=True)
+        value.flags.writeable = False
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model_name, keep_version=None):
+        """
+        Drop the entries of `model_name` (except those computed with weights `keep_version`).
+        Returns: number of entries dropped.
+        """
+        with self._lock:
+            stale = [key for key in self._entries if key[1] == model_name and key[2] != keep_version]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            per_model = collections.Counter(key[1] for key in self._entries)
+            lookups = self.hits + self.misses
+            return {
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries_per_model": dict(per_model)
+            }
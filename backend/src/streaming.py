@@ -0,0 +1,278 @@
+import math
+
+import numpy as np
+import tensorflow as tf
+
+from . import audio_io
+from . import config
+from . import preprocessing
+
+
+class AudioTooLongError(ValueError):
+    """Raised as soon as an upload is known to exceed the maximum duration (-> HTTP 413)."""
+
+
+class WaveformStream:
+    """
+    Incremental sink for the decoded samples of ONE upload, so /predict never holds the whole
+    recording: memory is bounded by the analysis window, not by the file size.
+
+    - feed(samples, sample_rate): decoded chunks in any sample rate (streaming polyphase resampling
+      to config.SAMPLE_RATE); raises AudioTooLongError once `max_seconds` is exceeded
+    - single mode: only the first AUDIO_MAX_LENGTH samples are kept (what the model sees anyway)
+    - windowed mode: windows with the same framing as preprocessing.frame_windows are cut as soon as
+      they are complete and handed to `on_windows(windows, lengths, starts)` in groups of `group_size`
+      (features are computed while the upload is still arriving); only the unwindowed tail is kept
+    - VAD (config.VAD_ENABLED): the first 2 windows are buffered and trimmed with trim_silence. A clip
+      that fits in that head is trimmed exactly like the whole-file path; longer clips only lose
+      their leading silence.
+    """
+
+    def __init__(self, windowed=False, on_windows=None, max_seconds=config.MAX_AUDIO_SECONDS,
+                 window=None, hop=None, group_size=config.STREAM_WINDOW_BATCH, vad=None):
+        self.windowed = windowed
+        self.on_windows = on_windows
+        self.window = window or config.AUDIO_MAX_LENGTH
+        self.hop = hop or int(config.WINDOW_HOP_SECONDS * config.SAMPLE_RATE)
+        self.group_size = max(1, int(group_size))
+        self.max_samples = int(max_seconds * config.SAMPLE_RATE) if max_seconds and max_seconds > 0 else None
+        self.vad = config.VAD_ENABLED if vad is None else vad
+
+        self.num_input_samples = 0  # samples fed, at their original rate
+        self.num_samples = 0      # decoded samples at config.SAMPLE_RATE (before trimming)
+        self.num_windows = 0
+        self.removed_start = 0
+        self.removed_end = 0
+
+        self._resampler = None
+        self._head = []
+        self._head_size = 0
+        self._in_head = self.vad
+        self._length = 0          # samples pushed after trimming
+        self._tail = np.zeros((0,), dtype=np.float32)
+        self._tail_start = 0      # position of _tail[0] in the trimmed stream
+        self._group = []
+
+    def check_duration(self, frames, sample_rate):
+        """
+        Early rejection from a declared length (e.g. the WAV header) before any sample is decoded.
+        """
+        if self.max_samples is not None and frames is not None and frames * config.SAMPLE_RATE > self.max_samples * sample_rate:
+            raise AudioTooLongError(f"{frames / sample_rate:.1f}s > {self.max_samples / config.SAMPLE_RATE:.0f}s")
+
+    def feed(self, samples, sample_rate=config.SAMPLE_RATE):
+        samples = np.asarray(samples, dtype=np.float32)
+        self.num_input_samples += len(samples)
+        if int(sample_rate) != config.SAMPLE_RATE:
+            audio_io.check_sample_rate(sample_rate)
+            if self._resampler is None:
+                self._resampler = preprocessing.StreamingResampler(sample_rate, config.SAMPLE_RATE)
+            samples = self._resampler.process(samples)
+        self._accept(samples)
+
+    def _accept(self, samples):
+        self.num_samples += len(samples)
+        if self.max_samples is not None and self.num_samples > self.max_samples:
+            raise AudioTooLongError(f"> {self.max_samples / config.SAMPLE_RATE:.0f}s")
+        if self._in_head:
+            self._head.append(samples)
+            self._head_size += len(samples)
+            if self._head_size >= 2 * self.window:
+                self._release_head(final=False)
+            return
+        self._push(samples)
+
+    def _release_head(self, final):
+        head = np.concatenate(self._head) if self._head else np.zeros((0,), dtype=np.float32)
+        self._head = []
+        self._in_head = False
+        trimmed, start, end = preprocessing.trim_silence(head)
+        self.removed_start = int(start)
+        if final:
+            # The whole clip is in the head: trailing silence is known too
+            self.removed_end = int(end)
+            self._push(trimmed.numpy())
+        else:
+            self._push(head[self.removed_start:])
+
+    def _push(self, samples):
+        self._length += len(samples)
+        if not self.windowed:
+            room = self.window - len(self._tail)
+            if room > 0:
+                self._tail = np.concatenate([self._tail, samples[:room]])
+            return
+
+        self._tail = np.concatenate([self._tail, samples])
+        while self.num_windows * self.hop + self.window <= self._length:
+            self._add_window()
+        # Samples before the next window start are never needed again
+        drop = min(self.num_windows * self.hop, self._length) - self._tail_start
+        if drop > 0:
+            self._tail = self._tail[drop:]
+            self._tail_start += drop
+
+    def _add_window(self):
+        start = self.num_windows * self.hop
+        offset = start - self._tail_start
+        segment = self._tail[offset:offset + self.window]
+        window = np.zeros((self.window,), dtype=np.float32)
+        window[:len(segment)] = segment
+        self._group.append((window, len(segment), start))
+        self.num_windows += 1
+        if len(self._group) >= self.group_size:
+            self._flush_group()
+
+    def _flush_group(self):
+        if not self._group:
+            return
+        windows, lengths, starts = zip(*self._group)
+        self._group = []
+        self.on_windows(np.stack(windows), np.asarray(lengths, dtype=np.int32), np.asarray(starts, dtype=np.int64))
+
+    def finish(self):
+        """
+        End of upload. Returns the first window's waveform (single mode) or None (windowed mode,
+        after the last, zero-padded windows were handed to on_windows).
+        """
+        if self._resampler is not None:
+            self._accept(self._resampler.flush())
+        if self._in_head:
+            self._release_head(final=True)
+        if not self.windowed:
+            return self._tail
+
+        total = 1 + max(0, math.ceil((self._length - self.window) / self.hop))
+        while self.num_windows < total:
+            self._add_window()
+        self._flush_group()
+        return None
+
+    @property
+    def length(self):
+        """
+        Samples after silence trimming.
+        """
+        return self._length
+
+    def vad_report(self):
+        if not self.vad:
+            return None
+        return preprocessing.vad_report(self.num_samples, self.removed_start, self.removed_end)
+
+
+def feed_wav_chunk(stream, decoder, chunk):
+    """
+    One upload chunk through an audio_io.WavStreamDecoder into `stream` (run on a compute thread).
+    The duration declared in the WAV header is checked as soon as the header is parsed.
+    """
+    samples = decoder.feed(chunk)
+    if decoder.header is not None:
+        stream.check_duration(decoder.declared_frames, decoder.sample_rate)
+        stream.feed(samples, decoder.sample_rate)
+
+
+class RollingFeatures:
+    """
+    Rolling STFT state for real-time inference (WebSocket): samples are pushed as they arrive,
+    only the NEW STFT frames (config.STFT_WINDOW_SIZE / STFT_STRIDE / N_FFT framing) are computed,
+    and every time `frames_per_window` (174) frames are available a feature window is emitted,
+    then again every `hop_frames` frames.
+
+    Emitted windows equal get_features_batch() of the same 90624 samples:
+    - MFCC: frames are independent, the rolling magnitudes are used as they are
+    - CNN-STFT: the per-clip normalisation (x - mean) / peak is applied afterwards to the stored
+      complex frames, STFT(a * (x - m)) = a * (STFT(x) - m * STFT(1)), with mean/peak of the window's samples
+    Kept state: the complex frames of one window and the samples since the oldest pending window.
+    """
+
+    def __init__(self, feature_type='stft', hop_frames=config.STREAM_HOP_FRAMES):
+        self.extractor = preprocessing.get_feature_extractor()
+        self.feature_type = feature_type
+        self.frames_per_window = config.MFCC_MAX_LEN
+        self.hop_frames = max(1, int(hop_frames))
+        self.stride = self.extractor.frame_step
+        self.frame_length = self.extractor.frame_length
+
+        self._audio = np.zeros((0,), dtype=np.float32)
+        self._audio_start = 0           # sample index of _audio[0]
+        self._spectra = np.zeros((0, self.extractor.fft_length // 2 + 1), dtype=np.complex64)
+        self._spectra_start = 0         # frame index of _spectra[0]
+        self.num_samples = 0
+        self.num_frames = 0
+        self.num_windows = 0
+        self._next_window_end = self.frames_per_window
+
+        self._stft_mel = self.extractor.stft_mel_matrix.numpy()
+        self._mfcc_mel = self.extractor.mfcc_mel_matrix.numpy()
+        self._dct = self.extractor.dct_matrix.numpy()
+        # STFT of a constant 1 over one frame: the mean-subtraction term of every frame
+        self._dc_frame = self._stft(np.ones((self.frame_length,), dtype=np.float32))[0]
+
+    def _stft(self, audio):
+        return tf.signal.stft(
+            tf.convert_to_tensor(audio), frame_length=self.frame_length, frame_step=self.stride,
+            fft_length=self.extractor.fft_length, window_fn=self.extractor._window_fn
+        ).numpy()
+
+    def push(self, samples):
+        """
+        Appends samples; returns the windows completed by them: [(features (H, W, 1), start_sample, end_sample)].
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        self._audio = np.concatenate([self._audio, samples])
+        self.num_samples += len(samples)
+
+        available = max(0, self.extractor.frame_count(self.num_samples))
+        if available > self.num_frames:
+            # Only the frames that became complete (the overlap with the previous frame is re-read)
+            offset = self.num_frames * self.stride - self._audio_start
+            segment = self._audio[offset:offset + (available - self.num_frames - 1) * self.stride + self.frame_length]
+            self._spectra = np.concatenate([self._spectra, self._stft(segment)])
+            self.num_frames = available
+
+        ready = []
+        while self._next_window_end <= self.num_frames:
+            ready.append(self._window(self._next_window_end - self.frames_per_window))
+            self.num_windows += 1
+            self._next_window_end += self.hop_frames
+
+        # Drop frames / samples no future window (or frame) needs
+        first_frame = self._next_window_end - self.frames_per_window
+        drop = min(first_frame, self.num_frames) - self._spectra_start
+        if drop > 0:
+            self._spectra = self._spectra[drop:]
+            self._spectra_start += drop
+        keep_from = min(first_frame, self.num_frames) * self.stride
+        if keep_from > self._audio_start:
+            self._audio = self._audio[keep_from - self._audio_start:]
+            self._audio_start = keep_from
+        return ready
+
+    def _window(self, first_frame):
+        spectra = self._spectra[first_frame - self._spectra_start:][:self.frames_per_window]
+        start = first_frame * self.stride
+        end = start + self.extractor.target_len
+
+        if self.feature_type == 'mfcc':
+            mel = np.abs(spectra) @ self._mfcc_mel
+            mfccs = np.log(mel + 1e-6) @ self._dct
+            return mfccs.T[..., None].astype(np.float32), start, end
+
+        audio = self._audio[start - self._audio_start:end - self._audio_start]
+        mean = audio.mean(dtype=np.float32)
+        scale = 1.0 / (np.max(np.abs(audio - mean)) + 1e-6)
+        magnitude = scale * np.abs(spectra - mean * self._dc_frame)
+        mel = magnitude @ self._stft_mel
+        return np.log(mel + 1e-6)[..., None].astype(np.float32), start, end
+
+    def tail_window(self):
+        """
+        Recording ended before the first full window: features of everything received so far
+        (zero-padded, same as a /predict upload). None once a window was emitted.
+        """
+        if self.num_windows:
+            return None
+        audio = self._audio[None, :self.extractor.target_len]
+        features = preprocessing.get_features_batch(audio, np.array([audio.shape[1]], dtype=np.int32), self.feature_type)
+        return features.numpy()[0], 0, audio.shape[1]
@@ -9,6 +9,17 @@ from tensorflow.python.profiler.option_builder import ProfileOptionBuilder
 
 from . import config
 
+def get_concrete_input_shape(model, batch_size=1):
+    """
+    Input shape dengan batch dim terisi. Dimensi spasial None (model dari pipeline bucketed)
+    diisi dengan ukuran fitur tetap ~5.6s: (174, 27, 1) untuk CNN-STFT, (40, 174, C) untuk Transfer Learning.
+    """
+    dims = list(model.inputs[0].shape[1:])
+    if dims[0] is None and dims[1] is None:
+        dims[:2] = [config.N_MFCC, config.MFCC_MAX_LEN]
+    dims = [config.MFCC_MAX_LEN if d is None else d for d in dims]
+    return [batch_size] + dims
+
 def get_flops(model, batch_size=1):
     """
     Menghitung FLOPs (Floating-Point Operations) untuk sebuah model Keras.
@@ -23,11 +34,9 @@ def get_flops(model, batch_size=1):
              return 0
 
         # Create a concrete function
-        # Note: model.inputs[0].shape[1:] excludes batch dimension
-        shape_list = list(model.inputs[0].shape[1:])
-        
+        # Note: variable (bucketed) time axes are resolved to the fixed feature size
         concrete_func = tf.function(model).get_concrete_function(
-            [tf.TensorSpec([batch_size] + shape_list, model.inputs[0].dtype)]
+            [tf.TensorSpec(get_concrete_input_shape(model, batch_size), model.inputs[0].dtype)]
         )
         
         frozen_func = convert_variables_to_constants_v2(concrete_func)
@@ -221,8 +230,7 @@ def evaluate_model(model, test_ds, class_names, model_name='custom_cnn'):
     
     # Inference Time (Average over 100 runs)
     # Fix Shape: input_shape usually (None, H, W, C). We want (1, H, W, C).
-    input_shape = model.input_shape
-    target_shape = (1,) + input_shape[1:] if input_shape[0] is None else input_shape
+    target_shape = get_concrete_input_shape(model)
     dummy_input = tf.random.normal(target_shape)
     
     # Warmup
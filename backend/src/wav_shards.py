@@ -0,0 +1,176 @@
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import tensorflow as tf
+
+from . import config
+from . import preprocessing
+
+INDEX_FILE = 'index.json'
+READ_AHEAD = 256
+
+# One tf.train.Example per clip: the original WAV bytes + metadata
+SHARD_FEATURES = {
+    'path': tf.io.FixedLenFeature([], tf.string),
+    'audio': tf.io.FixedLenFeature([], tf.string),
+    'label': tf.io.FixedLenFeature([], tf.string),
+    'speaker': tf.io.FixedLenFeature([], tf.string)
+}
+
+
+def _bytes_feature(value):
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def serialize_example(path, audio_bytes, label, speaker):
+    return tf.train.Example(features=tf.train.Features(feature={
+        'path': _bytes_feature(path.encode('utf-8')),
+        'audio': _bytes_feature(audio_bytes),
+        'label': _bytes_feature(str(label).encode('utf-8')),
+        'speaker': _bytes_feature(str(speaker).encode('utf-8'))
+    })).SerializeToString()
+
+
+def write_shards(file_paths, labels, speaker_ids, output_dir, shard_size_mb=config.SHARD_SIZE_MB, shuffle=True, seed=42,
+                 read_workers=config.DISCOVERY_WORKERS):
+    """
+    Packs WAV files into ~shard_size_mb TFRecord shards (raw WAV bytes + path/label/speaker) plus index.json.
+    Files are shuffled before packing (seeded) so every shard mixes classes & speakers, and read
+    with a thread pool so slow mounts are read ahead of the (sequential) shard writer.
+    Returns: the index dict.
+    """
+    records = [(os.path.abspath(p), l, s) for p, l, s in zip(file_paths, labels, speaker_ids)]
+    if shuffle:
+        random.Random(seed).shuffle(records)
+
+    os.makedirs(output_dir, exist_ok=True)
+    shard_limit = int(shard_size_mb * 1024 * 1024)
+    shards = []
+    paths = {}
+
+    writer = None
+    tmp_path = None
+
+    def close_shard():
+        writer.close()
+        os.replace(tmp_path, os.path.join(output_dir, shards[-1]["file"]))
+
+    def read_ahead(pool):
+        # Bounded read-ahead: at most READ_AHEAD files in memory while the writer catches up
+        for start in range(0, len(records), READ_AHEAD):
+            chunk = records[start:start + READ_AHEAD]
+            yield from zip(chunk, pool.map(_read_file, [r[0] for r in chunk]))
+
+    with ThreadPoolExecutor(max(1, read_workers)) as pool:
+        for (path, label, speaker), audio_bytes in read_ahead(pool):
+            if writer is None or shards[-1]["bytes"] >= shard_limit:
+                if writer is not None:
+                    close_shard()
+                name = f"shard-{len(shards):05d}.tfrecord"
+                tmp_path = os.path.join(output_dir, name + '.tmp')
+                writer = tf.io.TFRecordWriter(tmp_path)
+                shards.append({"file": name, "records": 0, "bytes": 0})
+
+            writer.write(serialize_example(path, audio_bytes, label, speaker))
+            shards[-1]["records"] += 1
+            shards[-1]["bytes"] += len(audio_bytes)
+            paths[path] = len(shards) - 1
+
+    if writer is not None:
+        close_shard()
+
+    index = {"num_records": len(paths), "shards": shards, "paths": paths}
+    with open(os.path.join(output_dir, INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def load_index(shard_dir):
+    with open(os.path.join(shard_dir, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def pack_splits(splits, output_dir, shard_size_mb=config.SHARD_SIZE_MB, seed=42):
+    """
+    Packs every split into its own shard directory (<output_dir>/<split>). write_shards mixes files
+    across all shards of a directory, so one directory for the whole dataset makes every split touch
+    every shard; per-split directories keep a val/test pass to that split's shards only.
+    A split whose existing index holds exactly the same files is reused, not packed again.
+    splits: {split_name: (file_paths, labels, speaker_ids)}
+    Returns: {split_name: shard_dir}
+    """
+    shard_dirs = {}
+    for name, (file_paths, labels, speaker_ids) in splits.items():
+        shard_dir = os.path.join(output_dir, name)
+        try:
+            packed = set(load_index(shard_dir)["paths"])
+        except (OSError, ValueError, KeyError):
+            packed = None
+        if packed != {os.path.abspath(p) for p in file_paths}:
+            index = write_shards(file_paths, labels, speaker_ids, shard_dir, shard_size_mb=shard_size_mb, seed=seed)
+            print(f"📦 Shards [{name}]: {index['num_records']} files -> {len(index['shards'])} shards ({shard_dir})")
+        shard_dirs[name] = shard_dir
+    return shard_dirs
+
+
+def read_shards(shard_dir, file_paths, label_indices, is_training=False):
+    """
+    Decoded (audio, length, label) elements for `file_paths`, read from the shards with
+    interleaved parallel TFRecord readers (large sequential reads instead of one open per file).
+    Only shards holding at least one requested file are opened; other records are filtered out,
+    and labels come from `label_indices` (the caller's split), not from the shard metadata.
+    With one directory per split (pack_splits) those are exactly the split's own shards.
+    """
+    index = load_index(shard_dir)
+    labels_by_path = {os.path.abspath(p): int(l) for p, l in zip(file_paths, label_indices)}
+    keys = list(labels_by_path)
+    missing = [k for k in keys if k not in index["paths"]]
+    if missing:
+        raise ValueError(f"{len(missing)} files are not in the shards of {shard_dir} (e.g. {missing[0]}); re-run tools/pack_wav_shards.py")
+
+    if not keys:
+        # Empty split (lookup tables cannot be empty): same element structure, no elements
+        return tf.data.Dataset.from_tensor_slices((tf.zeros([0, 0]), tf.zeros([0], tf.int32), tf.zeros([0], tf.int32)))
+
+    shard_ids = sorted({index["paths"][k] for k in keys})
+    shard_files = [os.path.join(shard_dir, index["shards"][i]["file"]) for i in shard_ids]
+
+    # Explicit dtypes: an empty split would otherwise be inferred as float32
+    table = tf.lookup.StaticHashTable(
+        tf.lookup.KeyValueTensorInitializer(tf.constant(keys, dtype=tf.string), tf.constant(list(labels_by_path.values()), dtype=tf.int32)),
+        default_value=-1
+    )
+
+    files = tf.data.Dataset.from_tensor_slices(tf.constant(shard_files, dtype=tf.string))
+    if is_training:
+        files = files.shuffle(max(1, len(shard_files)), seed=config.SHUFFLE_SEED, reshuffle_each_iteration=True)
+    # Deterministic interleave keeps seeded runs reproducible
+    dataset = files.interleave(
+        lambda f: tf.data.TFRecordDataset(f, buffer_size=8 * 1024 * 1024),
+        cycle_length=max(1, min(config.SHARD_READ_PARALLELISM, len(shard_files))),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=True
+    )
+
+    def parse(record):
+        example = tf.io.parse_single_example(record, SHARD_FEATURES)
+        return example['audio'], table.lookup(example['path'])
+
+    def decode(audio_bytes, label):
+        audio = preprocessing.decode_wav_bytes(audio_bytes, max_len=config.AUDIO_MAX_LENGTH)
+        return audio, tf.shape(audio)[0], label
+
+    dataset = dataset.map(parse, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.filter(lambda audio_bytes, label: label >= 0)
+    if is_training:
+        # Records are shuffled while still compressed WAV bytes (before decoding); shards were packed
+        # in shuffled order, so shard order + this buffer approximate a global shuffle
+        dataset = dataset.shuffle(config.SHARD_SHUFFLE_BUFFER, seed=config.SHUFFLE_SEED, reshuffle_each_iteration=True)
+    return dataset.map(decode, num_parallel_calls=tf.data.AUTOTUNE)
@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from . import config
+
+
+class ServerBusyError(Exception):
+    """Raised when the number of in-flight requests reached MAX_PENDING_REQUESTS."""
+
+
+class WorkerPools:
+    """
+    Bounded executors that keep CPU-bound work off the asyncio event loop.
+
+    - decode pool (processes): ffmpeg decoding of compressed uploads (webm/ogg/mp3).
+    - compute pool (threads): TF decode_wav, STFT/MFCC and inference (TF releases the GIL).
+
+    Admission control: at most `max_pending` requests may be in flight; beyond that
+    `acquire()` raises ServerBusyError so the endpoint can answer 503 instead of queueing forever.
+    """
+
+    def __init__(self, decode_workers=config.DECODE_WORKERS, compute_workers=config.COMPUTE_WORKERS,
+                 max_pending=config.MAX_PENDING_REQUESTS):
+        self.decode_workers = int(decode_workers)
+        self.compute_workers = max(1, int(compute_workers))
+        self.max_pending = int(max_pending)
+
+        self._decode_pool = None
+        self._compute_pool = None
+        self._lock = threading.Lock()
+
+        self.pending = 0
+        self.rejected = 0
+
+    @property
+    def decode_pool(self):
+        # 0 decode workers -> conversion runs in the compute thread pool instead
+        if self.decode_workers <= 0:
+            return self.compute_pool
+        with self._lock:
+            if self._decode_pool is None:
+                # 'spawn': never fork a process that already initialised TensorFlow
+                self._decode_pool = ProcessPoolExecutor(
+                    max_workers=self.decode_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._decode_pool
+
+    @property
+    def compute_pool(self):
+        with self._lock:
+            if self._compute_pool is None:
+                self._compute_pool = ThreadPoolExecutor(max_workers=self.compute_workers, thread_name_prefix='compute')
+            return self._compute_pool
+
+    def acquire(self):
+        """
+        Reserve one in-flight slot (raises ServerBusyError when full). Pair with `release()`.
+        """
+        with self._lock:
+            if self.max_pending > 0 and self.pending >= self.max_pending:
+                self.rejected += 1
+                raise ServerBusyError(f"{self.pending} requests in flight (max {self.max_pending})")
+            self.pending += 1
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+    async def run_decode(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.decode_pool, fn, *args)
+
+    async def run_compute(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.compute_pool, fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            for pool in (self._decode_pool, self._compute_pool):
+                if pool is not None:
+                    pool.shutdown(wait=False, cancel_futures=True)
+            self._decode_pool = None
+            self._compute_pool = None
+
+    def stats(self):
+        return {
+            "decode_workers": self.decode_workers,
+            "compute_workers": self.compute_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected
+        }
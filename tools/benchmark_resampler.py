@@ -0,0 +1,89 @@
+"""
+Resampler Benchmark: Polyphase FIR vs Bilinear (tf.image.resize)
+Compares the polyphase resampler in backend/src/preprocessing.py against the old
+bilinear path that /predict used before, on the common upload rates -> config.SAMPLE_RATE.
+
+Metrics:
+- Speed: mean wall time per clip (ms)
+- In-band fidelity: SNR (dB) of a resampled 440 Hz + 3 kHz tone mix vs the analytic signal at 16 kHz
+- Aliasing: energy (dB, relative to input) that an out-of-band tone (above the target Nyquist) leaks into the output
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from src import config, preprocessing  # noqa: E402
+
+RATES = preprocessing.COMMON_SAMPLE_RATES
+DURATION_SEC = 5.0
+REPEATS = 5
+
+
+def resample_bilinear(audio, orig_sr, target_sr=config.SAMPLE_RATE):
+    """The previous /predict resampling: audio treated as a 1xT image and resized bilinearly."""
+    audio_tensor = tf.cast(audio, tf.float32)
+    new_len = int(len(audio) * target_sr / orig_sr)
+    audio_reshaped = tf.reshape(audio_tensor, [1, 1, -1, 1])
+    audio_resized = tf.image.resize(audio_reshaped, [1, new_len], method='bilinear')
+    return tf.squeeze(audio_resized).numpy()
+
+
+def tone(freqs, sr, duration=DURATION_SEC):
+    t = np.arange(int(sr * duration)) / sr
+    return sum(0.3 * np.sin(2 * np.pi * f * t) for f in freqs).astype(np.float32)
+
+
+def snr_db(reference, estimate):
+    n = min(len(reference), len(estimate))
+    # Ignore filter edges
+    edge = n // 20
+    ref, est = reference[edge:n - edge], estimate[edge:n - edge]
+    return 10 * np.log10(np.sum(ref ** 2) / (np.sum((ref - est) ** 2) + 1e-20))
+
+
+def energy_db(signal, reference):
+    return 10 * np.log10((np.mean(signal ** 2) + 1e-20) / (np.mean(reference ** 2) + 1e-20))
+
+
+def time_ms(fn, *args):
+    fn(*args)  # warm-up (filter design / graph setup)
+    t_start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(*args)
+    return (time.perf_counter() - t_start) / REPEATS * 1000
+
+
+def run_benchmark():
+    target_sr = config.SAMPLE_RATE
+    print(f"🚀 Resampler benchmark -> {target_sr} Hz ({DURATION_SEC:.0f}s clips, {REPEATS} runs)\n")
+    header = f"{'Rate':>8} | {'Method':>9} | {'Time (ms)':>9} | {'SNR (dB)':>8} | {'Alias (dB)':>10}"
+    print(header)
+    print("-" * len(header))
+
+    in_band = (440.0, 3000.0)
+    reference = tone(in_band, target_sr)
+
+    for sr in RATES:
+        if sr == target_sr:
+            continue
+        clean = tone(in_band, sr)
+        # Out-of-band tone only exists for inputs above the target rate
+        alias_freq = 0.45 * sr if sr > target_sr else None
+        alias_input = tone((alias_freq,), sr) if alias_freq else None
+
+        for name, fn in (('polyphase', preprocessing.resample_poly), ('bilinear', resample_bilinear)):
+            elapsed = time_ms(fn, clean, sr)
+            snr = snr_db(reference, fn(clean, sr))
+            alias = energy_db(fn(alias_input, sr), alias_input) if alias_input is not None else float('nan')
+            print(f"{sr:>8} | {name:>9} | {elapsed:>9.2f} | {snr:>8.1f} | {alias:>10.1f}")
+
+    print("\nAlias: lower is better (an ideal resampler removes the out-of-band tone completely).")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,72 @@
+"""
+Feature Cache Consistency Check
+Fills the on-disk feature cache (backend/src/feature_cache.py) the way a training sweep does, from a
+partially-warm state: one feature type already holds some of the files, the others hold none. Then
+every cached row is compared against features computed without the cache.
+
+This covers the multi-feature fill (materialize_features), where the caches are missing different
+files and rows must still end up stored under the right content hash.
+
+Usage:
+    python tools/check_feature_cache.py [num_files]
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from src import config, feature_cache, preprocessing  # noqa: E402
+
+FEATURE_TYPES = ('mfcc', 'stft')
+TOLERANCE = 1e-4
+
+
+def write_test_clips(directory, num_files, seed=0):
+    """Distinct synthetic clips (random tones + noise, different lengths) as 16-bit WAVs."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(num_files):
+        num_samples = int(rng.integers(config.AUDIO_MAX_LENGTH // 4, config.AUDIO_MAX_LENGTH + 4000))
+        t = np.arange(num_samples) / config.SAMPLE_RATE
+        audio = 0.3 * np.sin(2 * np.pi * rng.uniform(100, 4000) * t) + 0.05 * rng.standard_normal(num_samples)
+        path = os.path.join(directory, f"clip_{i:03d}.wav")
+        wav = tf.audio.encode_wav(tf.constant(audio[:, None], tf.float32), config.SAMPLE_RATE)
+        tf.io.write_file(path, wav)
+        paths.append(path)
+    return paths
+
+
+def uncached_features(paths, feature_type):
+    audio, lengths = preprocessing.stack_waveforms(
+        [preprocessing.load_wav(path, max_len=config.AUDIO_MAX_LENGTH).numpy() for path in paths])
+    return preprocessing.get_features_batch(audio, lengths, feature_type=feature_type).numpy()
+
+
+def check_feature_cache(num_files=12):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_test_clips(tmp, num_files)
+        cache_dir = os.path.join(tmp, 'cache')
+
+        # Partially warm: only the first type, and only every third file
+        feature_cache.materialize_features(cache_dir, paths[::3], feature_types=FEATURE_TYPES[:1], batch_size=4)
+        caches = feature_cache.materialize_features(cache_dir, paths, feature_types=FEATURE_TYPES, batch_size=4)
+
+        ok = True
+        for feature_type, cache in caches.items():
+            shard_ids, rows = cache.locate(cache.digests(paths))
+            cached = cache.gather(shard_ids, rows)
+            expected = uncached_features(paths, feature_type)
+            max_diff = float(np.abs(cached - expected).max())
+            status = "✅" if max_diff <= TOLERANCE else "❌"
+            ok &= max_diff <= TOLERANCE
+            print(f"{status} {feature_type}: {len(paths)} files, max |cached - uncached| = {max_diff:.2e}")
+    return ok
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    sys.exit(0 if check_feature_cache(count) else 1)
@@ -133,6 +133,12 @@ notebook_content = {
     "    # Override Config untuk Kaggle Output\n",
     "    config.MODELS_DIR = os.path.join(OUTPUT_ROOT, 'models')\n",
     "    config.OUTPUTS_DIR = os.path.join(OUTPUT_ROOT, 'outputs')\n",
+    "    config.FEATURE_CACHE_DIR = os.path.join(OUTPUT_ROOT, 'feature_cache')\n",
+    "    config.DATASET_INDEX_DIR = os.path.join(OUTPUT_ROOT, 'dataset_index')\n",
+    "    # Shard mode: tiap split dipack ke TFRecord shards (dataset di mount lambat). True -> OUTPUT_ROOT/wav_shards\n",
+    "    USE_WAV_SHARDS = False\n",
+    "    if USE_WAV_SHARDS and not config.WAV_SHARD_DIR:\n",
+    "        config.WAV_SHARD_DIR = os.path.join(OUTPUT_ROOT, 'wav_shards')\n",
     "    os.makedirs(config.MODELS_DIR, exist_ok=True)\n",
     "    os.makedirs(config.OUTPUTS_DIR, exist_ok=True)\n",
     "    print(f\"📂 Output Directory set to: {config.OUTPUTS_DIR}\")\n",
@@ -336,15 +342,11 @@ torgo_files, torgo_labels, torgo_speakers = data_loader.get_file_paths(torgo_pat
 # --- GENERATE DATASET STATS FOR DASHBOARD ---
 import json
 print(\"Generating Dataset Statistics...\")
-def get_stats(name, files, labels, speakers):
-    unique_lbl = list(set(labels)); counts = {l: 0 for l in unique_lbl}
-    for l in labels: counts[l] += 1
-    summary = []
-    for l in unique_lbl:
-        cat = \"Dysarthric\" if l == 1 else \"Control\"; total = counts[l]
-        summary.append({\"category\": cat, \"speakers\": len(set(speakers)), \"totalRaw\": total, \"trainRaw\": int(total * 0.8), \"testRaw\": total - int(total * 0.8)})
-    return {\"name\": name, \"stats\": {\"samples\": f\"{len(files):,}\", \"classes\": str(len(unique_lbl)), \"avgLen\": \"N/A\"}, \"summaryData\": summary}
-stats_export = {\"uaspeech\": get_stats('UASpeech', uaspeech_files, uaspeech_labels, uaspeech_speakers), \"torgo\": get_stats('TORGO', torgo_files, torgo_labels, torgo_speakers)}
+from src.manifest import Manifest
+# Columnar manifest (label/speaker codes + durations from WAV headers): stats are vectorised
+uaspeech_manifest = Manifest.from_lists(uaspeech_files, uaspeech_labels, uaspeech_speakers)
+torgo_manifest = Manifest.from_lists(torgo_files, torgo_labels, torgo_speakers)
+stats_export = {\"uaspeech\": uaspeech_manifest.dataset_stats('UASpeech'), \"torgo\": torgo_manifest.dataset_stats('TORGO')}
 with open(os.path.join(config.OUTPUTS_DIR, \"dataset_stats.json\"), 'w') as f: json.dump(stats_export, f, indent=4)
 
 # --- GENERATE REAL EDA SAMPLES (Audio + Signals + STFT) ---
@@ -475,8 +477,8 @@ import os
 print(\"\\n--- 2. Membangun dan Meringkas Semua Arsitektur Model ---\")
 summary_list = []
 
-# Setup Input Shape Standar untuk Analisa (3 Channel untuk Model TL, 1 Channel untuk STFT)
-input_shape_mfcc = (config.N_MFCC, config.MFCC_MAX_LEN, 3)
+# Setup Input Shape Standar untuk Analisa (1 Channel: Model TL broadcast ke 3 Channel di dalam graph)
+input_shape_mfcc = (config.N_MFCC, config.MFCC_MAX_LEN, 1)
 n_stft_bins = (config.N_FFT // 2) + 1
 input_shape_stft = (n_stft_bins, config.MFCC_MAX_LEN, 1)
 
@@ -593,18 +595,35 @@ for dataset_name, (data_files, data_labels, data_speakers) in datasets.items():
     print(f\"--- Data Distribution ({dataset_name}) [Paper 2 Style] ---\")
     print(f\"[Train] {len(X_train)} | [Val] {len(X_val)} | [Test] {len(X_test)}\")
 
+    shard_dirs = {}
+    if config.WAV_SHARD_DIR:
+        # Shard mode (WAV_SHARD_DIR): each split packed into its own TFRecord shards (few large sequential reads
+        # instead of one open per file); val/test only read their own shards. Raw-audio pipeline, no feature cache
+        from src import wav_shards
+        speakers_by_path = dict(zip(data_files, data_speakers))
+        shard_dirs = wav_shards.pack_splits({
+            split: (list(X_split), list(y_split), [speakers_by_path[f] for f in X_split])
+            for split, (X_split, y_split) in {'train': (X_train, y_train), 'val': (X_val, y_val), 'test': (X_test, y_test)}.items()
+        }, os.path.join(config.WAV_SHARD_DIR, dataset_name))
+        feature_cache_dir = None
+    else:
+        # Shared front-end: decode each file ONCE, cache STFT-Mel + MFCC; every model below only selects its view
+        feature_types = sorted({'stft' if model_key == 'cnn_stft' else 'mfcc' for model_key in config.MODELS})
+        data_loader.precompute_features(X, config.FEATURE_CACHE_DIR, feature_types)
+        feature_cache_dir = config.FEATURE_CACHE_DIR
+
     for model_key, model_display_name in config.MODELS.items():
         print(f\"\\n--- Training Pipeline: {model_display_name} @ {dataset_name} ---\")
 
         try:
             feature_type = 'stft' if model_key == 'cnn_stft' else 'mfcc'
-            train_ds = data_loader.create_tf_dataset(X_train, y_train, class_mapping, is_training=True, feature_type=feature_type)
-            val_ds = data_loader.create_tf_dataset(X_val, y_val, class_mapping, is_training=False, feature_type=feature_type)
-            test_ds = data_loader.create_tf_dataset(X_test, y_test, class_mapping, is_training=False, feature_type=feature_type)
+            # Optional length bucketing for training (variable time axis); val/test stay fixed-length like serving
+            bucketed = config.BUCKETED_TRAINING and models.supports_variable_length(model_key)
+            train_ds = data_loader.create_tf_dataset(X_train, y_train, class_mapping, is_training=True, feature_type=feature_type, cache_dir=feature_cache_dir, shard_dir=shard_dirs.get('train'), bucketed=bucketed)
+            val_ds = data_loader.create_tf_dataset(X_val, y_val, class_mapping, is_training=False, feature_type=feature_type, cache_dir=feature_cache_dir, shard_dir=shard_dirs.get('val'))
+            test_ds = data_loader.create_tf_dataset(X_test, y_test, class_mapping, is_training=False, feature_type=feature_type, cache_dir=feature_cache_dir, shard_dir=shard_dirs.get('test'))
 
-            input_shape = None
-            for feature, label in train_ds.take(1):
-                input_shape = feature.shape[1:]; break
+            input_shape = tuple(train_ds.element_spec[0].shape[1:])
 
             tf.keras.backend.clear_session()
             model = models.get_model(model_key, input_shape, num_classes=len(unique_classes))
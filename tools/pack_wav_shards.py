@@ -0,0 +1,50 @@
+"""
+Pack WAV Dataset into TFRecord Shards
+Discovers a dataset with data_loader.get_file_paths and packs every clip (raw WAV bytes + path,
+label, speaker) into large sequential TFRecord shards, so training reads a few big files instead
+of opening hundreds of thousands of small ones (slow on Kaggle / GCS-style mounts).
+
+Usage:
+    python tools/pack_wav_shards.py <dataset_root> <dataset_name> <output_dir> [shard_size_mb]
+
+Then train with:
+    data_loader.create_tf_dataset(X_train, y_train, class_mapping, ..., shard_dir=<output_dir>)
+
+Files are mixed across all shards, so every split read from one whole-dataset pack opens every shard.
+For train/val/test training runs, pack each split on its own with wav_shards.pack_splits (what the
+Kaggle notebook does with USE_WAV_SHARDS / WAV_SHARD_DIR).
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from src import config, data_loader, wav_shards  # noqa: E402
+
+
+def pack_wav_shards(dataset_root, dataset_name, output_dir, shard_size_mb=config.SHARD_SIZE_MB):
+    print(f"🚀 Packing {dataset_name} ({dataset_root}) -> {output_dir}")
+
+    file_paths, labels, speaker_ids = data_loader.get_file_paths(dataset_root, dataset_name)
+    if not file_paths:
+        print("❌ Error: no audio files found, nothing to pack.")
+        return None
+
+    t_start = time.perf_counter()
+    index = wav_shards.write_shards(file_paths, labels, speaker_ids, output_dir, shard_size_mb=shard_size_mb)
+    elapsed = time.perf_counter() - t_start
+
+    total_bytes = sum(shard["bytes"] for shard in index["shards"])
+    print(f"✅ {index['num_records']} files -> {len(index['shards'])} shards "
+          f"({total_bytes / 1e6:.1f} MB) in {elapsed:.1f}s")
+    return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Usage: python tools/pack_wav_shards.py <dataset_root> <dataset_name> <output_dir> [shard_size_mb]")
+        sys.exit(1)
+
+    shard_size = float(sys.argv[4]) if len(sys.argv) > 4 else config.SHARD_SIZE_MB
+    pack_wav_shards(sys.argv[1], sys.argv[2], sys.argv[3], shard_size)